@@ -1,22 +1,42 @@
+import asyncio
 import datetime
+import heapq
 from urllib.parse import urljoin
 
 import aiohttp
 
 
+# connections kept open to FMP, at most
+MAX_CONNECTIONS = 20
+
+
 class FinancialModelingPrep:
     def __init__(self, key):
         self._key = key
         self._basepath = "https://financialmodelingprep.com"
+        self._session = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        # created on first use, so it's bound to the loop serving requests
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=MAX_CONNECTIONS)
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
 
     async def _get(self, url, *args, **kwargs):
-        async with aiohttp.ClientSession() as session:
-            if "params" in kwargs:
-                params = kwargs.pop("params")
-                params["apikey"] = self._key
-                kwargs["params"] = params
-            async with session.get(self._get_url(url), *args, **kwargs) as response:
-                return await response.json()
+        if "params" in kwargs:
+            params = kwargs.pop("params")
+            params["apikey"] = self._key
+            kwargs["params"] = params
+        async with self.session.get(self._get_url(url), *args, **kwargs) as response:
+            return await response.json()
 
     def _get_url(self, endpoint):
         return urljoin(self._basepath, endpoint)
@@ -41,34 +61,45 @@ class FinancialModelingPrep:
         [date, time] = date.split(" ")
         return datetime.datetime.fromisoformat(f"{date}T{time}")
 
+    @staticmethod
+    def _newest_first(items):
+        # the feeds come sorted already, only sort when one doesn't
+        if any(
+            a["publishedDate"] < b["publishedDate"] for a, b in zip(items, items[1:])
+        ):
+            items.sort(key=lambda x: x["publishedDate"], reverse=True)
+        return items
+
     async def get_interleaved_news(self, symbol):
-        news = await self.get_news(symbol)
-        press_releases = await self.get_press_releases(symbol)
+        news, press_releases = await asyncio.gather(
+            self.get_news(symbol), self.get_press_releases(symbol)
+        )
 
         # symbol, publishedDate, title, image, site, text, url
-        res = []
         for new in news:
             new["publishedDate"] = self._parse_date(new["publishedDate"])
             new["isPressRelease"] = False
-            res.append(new)
-
-        for press_release in press_releases:
-            res.append(
-                {
-                    "symbol": symbol,
-                    "publishedDate": self._parse_date(press_release["date"]),
-                    "title": press_release["title"],
-                    "image": "",
-                    "site": "",
-                    "text": press_release["text"],
-                    "url": "",
-                    "isPressRelease": True,
-                }
-            )
 
-        return list(
-            map(
-                lambda x: {**x, "publishedDate": x["publishedDate"].isoformat()},
-                sorted(res, key=lambda x: x["publishedDate"], reverse=True),
+        press_releases = [
+            {
+                "symbol": symbol,
+                "publishedDate": self._parse_date(press_release["date"]),
+                "title": press_release["title"],
+                "image": "",
+                "site": "",
+                "text": press_release["text"],
+                "url": "",
+                "isPressRelease": True,
+            }
+            for press_release in press_releases
+        ]
+
+        return [
+            {**x, "publishedDate": x["publishedDate"].isoformat()}
+            for x in heapq.merge(
+                self._newest_first(news),
+                self._newest_first(press_releases),
+                key=lambda x: x["publishedDate"],
+                reverse=True,
             )
-        )
+        ]
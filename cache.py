@@ -104,6 +104,16 @@ class InMemoryCache:
             key, serializer(data), expire=int(expiry.total_seconds())
         )
 
+    async def getBytes(self, key):
+        key = f"{DEFAULT_KEY_PREFIX}:{key}"
+        logger.info("InMemory: getBytes %s", key)
+        return await self._client.get(key)
+
+    async def setBytes(self, key, data: bytes, expiry: datetime.timedelta):
+        key = f"{DEFAULT_KEY_PREFIX}:{key}"
+        logger.info("InMemory: setBytes %s %s bytes %s", key, len(data), expiry)
+        return await self._client.set(key, data, expire=int(expiry.total_seconds()))
+
 
 class Cache:
     def __init__(self):
@@ -146,6 +156,15 @@ class Cache:
         await self._persistent_cache.setJSON(key, data, expiry, serializer)
         await self._in_memory_cache.setJSON(key, data, expiry, serializer)
 
+    # binary values are only kept in redis, not persisted to mongo
+    async def getBytes(self, key):
+        await self.init()
+        return await self._in_memory_cache.getBytes(key)
+
+    async def setBytes(self, key, data: bytes, expiry=DEFAULT_EXPIRY):
+        await self.init()
+        return await self._in_memory_cache.setBytes(key, data, expiry)
+
     async def getCachedOrGetFromSourceAndCache(
         self, key, coro, expiry=DEFAULT_EXPIRY, serializer=DEFAULT_SERIALIZER
     ):
@@ -153,4 +172,7 @@ class Cache:
         if data is None:
             data = await coro
             await self.setJSON(key, data, expiry, serializer)
+        else:
+            # not needed, close it rather than leave it never awaited
+            coro.close()
         return data
@@ -0,0 +1,52 @@
+import email.utils
+
+from aiohttp import web
+
+from payloads import etag_matches
+from versions import versions
+
+CACHE_CONTROL = "public, no-cache"
+
+
+def _not_modified_since(request: web.Request, last_modified: float) -> bool:
+    # If-None-Match takes precedence when both are sent
+    if "If-None-Match" in request.headers or request.if_modified_since is None:
+        return False
+    return int(last_modified) <= request.if_modified_since.timestamp()
+
+
+def conditional_middleware(dependencies: dict):
+    """Validates GET requests against version stamps before running the handler.
+
+    `dependencies` maps a route's path to a function of the request returning
+    the names of the version stamps its response depends on, or None when the
+    response can't be validated this way.
+    """
+
+    @web.middleware
+    async def middleware(request: web.Request, handler):
+        resource = request.match_info.route.resource
+        depends_on = (
+            dependencies.get(resource.canonical)
+            if request.method == "GET" and resource is not None
+            else None
+        )
+        names = depends_on(request) if depends_on is not None else None
+        if names is None:
+            return await handler(request)
+
+        etag, last_modified = versions.stamp(names)
+        headers = {
+            "ETag": etag,
+            "Last-Modified": email.utils.formatdate(last_modified, usegmt=True),
+            "Cache-Control": CACHE_CONTROL,
+        }
+        if etag_matches(request, etag) or _not_modified_since(request, last_modified):
+            return web.Response(status=304, headers=headers)
+
+        response = await handler(request)
+        if response.status == 200:
+            response.headers.update(headers)
+        return response
+
+    return middleware
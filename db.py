@@ -1,14 +1,21 @@
 import asyncio
+import hashlib
+import json
 from typing import List
 
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReplaceOne
+from pymongo.errors import OperationFailure
 
 from strategies import STRATEGIES, Strategy
+from versions import versions
 
 
 class DB:
     def __init__(self, host="localhost"):
         self.client = AsyncIOMotorClient(host=host)
+        # slug -> strategy meta, strategies are only written by init
+        self._strategy_metas = {}
 
     @property
     def db(self):
@@ -16,12 +23,63 @@ class DB:
 
     async def init(self):
         strategies = [strategy.meta for strategy in STRATEGIES.values()]
-        await self.db.strategies.delete_many({})
-        await self.db.strategies.insert_many(strategies)
+        # every API process runs this at startup, so strategies are upserted by
+        # slug rather than recreated; the unique index keeps racing upserts from
+        # inserting a slug twice, once duplicates of earlier races are gone
+        duplicates = self.db.strategies.aggregate(
+            [
+                {"$sort": {"_id": 1}},
+                {"$group": {"_id": "$slug", "ids": {"$push": "$_id"}}},
+                {"$match": {"ids.1": {"$exists": True}}},
+            ]
+        )
+        async for duplicate in duplicates:
+            await self.db.strategies.delete_many({"_id": {"$in": duplicate["ids"][1:]}})
+        try:
+            await self.db.strategies.create_index("slug", unique=True)
+        except OperationFailure as ex:
+            print("indexing strategies by slug failed", ex)
+        await self.db.strategies.bulk_write(
+            [
+                ReplaceOne({"slug": strategy["slug"]}, strategy, upsert=True)
+                for strategy in strategies
+            ],
+            ordered=False,
+        )
+        await self.db.strategies.delete_many(
+            {"slug": {"$nin": [strategy["slug"] for strategy in strategies]}}
+        )
+        # responses including strategies change with their yml files
+        digest = hashlib.sha1(
+            json.dumps(strategies, sort_keys=True, default=str).encode()
+        ).hexdigest()
+        await versions.set_digest("strategies", digest)
+        self._strategy_metas = {
+            meta["slug"]: meta async for meta in self.db.strategies.find()
+        }
+
+    async def get_strategy_meta(self, slug):
+        meta = self._strategy_metas.get(slug)
+        if meta is None:
+            # init ran in another process
+            meta = await self.db.strategies.find_one({"slug": slug})
+            if meta is not None:
+                self._strategy_metas[slug] = meta
+        return meta
+
+    @staticmethod
+    def _precedented_attrs(slug):
+        for strategy in STRATEGIES.values():
+            if strategy.slug == slug:
+                return strategy.precedented_attrs
+        return Strategy.from_yml(slug).precedented_attrs
 
     async def update_fundamentals_data(self, screener, csv):
         strategy = STRATEGIES[int(screener)]
-        stocks = strategy.csv_to_db_object(csv)
+        # parsing big CSVs takes a while, keep the loop serving requests meanwhile
+        stocks = await asyncio.get_event_loop().run_in_executor(
+            None, strategy.csv_to_db_object, csv
+        )
         # print(stocks)
 
         prev_stocks = await self.get_stocks_in_strategy(strategy.slug)
@@ -60,22 +118,23 @@ class DB:
             )
 
     async def get_stock_data(self, strategy_slug, symbol):
-        all_stocks_data = await self.db.strategies.all_stocks.find_one(
-            {"symbol": symbol}
+        all_stocks_data, strategy_data = await asyncio.gather(
+            self.db.strategies.all_stocks.find_one({"symbol": symbol}),
+            self.db.strategies[strategy_slug.replace("-", "_")].find_one(
+                {"symbol": symbol}
+            ),
         )
 
         if all_stocks_data is None:
             return None
 
-        strategy_data = await self.db.strategies[
-            strategy_slug.replace("-", "_")
-        ].find_one({"symbol": symbol}) or {"fundamentals": {}}
+        strategy_data = strategy_data or {"fundamentals": {}}
 
         return {
             **all_stocks_data["fundamentals"],
             **self.sub_dict(
                 strategy_data["fundamentals"],
-                Strategy.from_yml(strategy_slug).precedented_attrs,
+                self._precedented_attrs(strategy_slug),
             ),
         }
 
@@ -105,8 +164,11 @@ class DB:
         return {key: data[key] for key in needed_keys if key in data}
 
     async def get_stock_meta_for_strategy(self, symbol, strategy_slug):
-        all_stocks_meta = await self.db.strategies.find_one({"slug": "all-stocks"})
-        strategy_meta = await self.db.strategies.find_one({"slug": strategy_slug})
+        all_stocks_meta, strategy_meta, stock_data = await asyncio.gather(
+            self.get_strategy_meta("all-stocks"),
+            self.get_strategy_meta(strategy_slug),
+            self.get_stock_data(strategy_slug, symbol),
+        )
 
         return {
             "symbol": symbol,
@@ -115,10 +177,10 @@ class DB:
                 **all_stocks_meta["attrs_slug_to_name"],
                 **self.sub_dict(
                     strategy_meta["attrs_slug_to_name"],
-                    Strategy.from_yml(strategy_slug).precedented_attrs,
+                    self._precedented_attrs(strategy_slug),
                 ),
             },
-            "meta": await self.get_stock_data(strategy_slug, symbol),
+            "meta": stock_data,
         }
 
     async def get_symbols_for_strategy(self, slug):
@@ -0,0 +1,83 @@
+import asyncio
+import collections
+import json
+import logging
+import os
+import uuid
+
+import aioredis
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = "redis://localhost"
+EVENTS_CHANNEL = "fpc:events"
+
+
+class Events:
+    """Data change events, e.g. candles written or fundamentals uploaded.
+
+    Handlers in this process always get published events. Once connected, events
+    are also published over Redis pub/sub, and with `subscribe` the events of
+    other processes are handled here too, so their in-memory caches stay in sync.
+    """
+
+    def __init__(self):
+        self._handlers = collections.defaultdict(list)
+        self._origin = f"{os.getpid()}-{uuid.uuid4().hex}"
+        self._redis = None
+        self._listener = None
+
+    def on(self, event: str):
+        """Decorator registering a coroutine function as a handler of `event`."""
+
+        def decorator(handler):
+            self._handlers[event].append(handler)
+            return handler
+
+        return decorator
+
+    async def publish(self, event: str, **data):
+        await self._dispatch(event, data)
+        if self._redis is not None:
+            message = {"event": event, "data": data, "origin": self._origin}
+            try:
+                await self._redis.publish(EVENTS_CHANNEL, json.dumps(message))
+            except Exception:
+                logger.exception("publishing %s event failed", event)
+
+    async def _dispatch(self, event: str, data: dict):
+        for handler in self._handlers[event]:
+            try:
+                await handler(**data)
+            except Exception:
+                logger.exception("handling %s event failed", event)
+
+    async def connect(self, subscribe: bool, url: str = REDIS_URL):
+        self._redis = await aioredis.create_redis_pool(url)
+        if subscribe:
+            # subscribing takes over a connection, so it gets its own
+            subscriber = await aioredis.create_redis(url)
+            (channel,) = await subscriber.subscribe(EVENTS_CHANNEL)
+            self._listener = asyncio.create_task(self._listen(subscriber, channel))
+
+    async def _listen(self, subscriber, channel):
+        try:
+            async for raw in channel.iter(encoding="utf-8"):
+                message = json.loads(raw)
+                if message["origin"] != self._origin:
+                    await self._dispatch(message["event"], message["data"])
+        finally:
+            subscriber.close()
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+        if self._redis is not None:
+            self._redis.close()
+            await self._redis.wait_closed()
+            self._redis = None
+
+
+events = Events()
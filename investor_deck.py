@@ -34,21 +34,39 @@ class CompanyPresentationList(typing.TypedDict):
     Documents: typing.List[CompanyPresentation]
 
 
+# presentation lists are cached until their first signed URL is this close to
+# expiring, and for at most MAX_PRESENTATIONS_TTL
+EXPIRY_MARGIN = datetime.timedelta(minutes=5)
+MAX_PRESENTATIONS_TTL = datetime.timedelta(hours=6)
+
+
 class InvestorDeck:
     _base_url = "https://api.investordeck.com/"
 
     def __init__(self, api_key):
         self._key = api_key
+        self._session = None
 
     def _get_url(self, endpoint):
         return urljoin(self._base_url, endpoint)
 
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        # created on first use, so it's bound to the loop serving requests
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(headers={"api-token": self._key})
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
     async def _get(self, url: str, params: dict = {}):
         """Helper method for creating authenticated GET requests"""
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers={"api-token": self._key}) as response:
-                data = await response.json()
-                return data
+        async with self.session.get(url) as response:
+            data = await response.json()
+            return data
 
     async def get_company_presentations(
         self, symbol, limit=1000, offset=0
@@ -97,6 +115,19 @@ class InvestorDeck:
             datetime.date(year, month, 1), datetime.datetime.min.time()
         )
 
+    @staticmethod
+    def presentation_urls_ttl(presentation_urls) -> datetime.timedelta:
+        """How long a get_company_presentation_urls result can be served for."""
+        if not presentation_urls:
+            return MAX_PRESENTATIONS_TTL
+        expiry = min(presentation["expiry"] for presentation in presentation_urls)
+        ttl = (
+            datetime.datetime.fromtimestamp(expiry)
+            - datetime.datetime.now()
+            - EXPIRY_MARGIN
+        )
+        return min(ttl, MAX_PRESENTATIONS_TTL)
+
     async def get_company_presentation_urls(self, symbol):
         presentations = await self.get_company_presentations(symbol)
         res = []
@@ -0,0 +1,223 @@
+import asyncio
+import collections
+import json
+import logging
+import time
+import uuid
+
+import aioredis
+
+logger = logging.getLogger(__name__)
+
+# submitting more unfinished jobs than this is refused
+MAX_PENDING_JOBS = 16
+# this many finished jobs are kept around for their status to be looked up
+KEEP_FINISHED = 500
+
+REDIS_URL = "redis://localhost"
+# jobs submitted by other processes, waiting for the one running them
+SUBMITTED_KEY = "fpc:jobs"
+# status of a job by id, kept for a day
+JOB_KEY = "fpc:job:{}"
+JOB_TTL = 24 * 60 * 60
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job:
+    __slots__ = (
+        "id",
+        "name",
+        "key",
+        "status",
+        "error",
+        "created_at",
+        "started_at",
+        "finished_at",
+    )
+
+    def __init__(self, name: str, key: str):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.key = key
+        self.status = "queued"
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def done(self):
+        return self.status in ["done", "failed"]
+
+    def fields(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    def json(self):
+        return _describe(self.fields())
+
+
+def _describe(fields: dict):
+    started_at, finished_at = fields["started_at"], fields["finished_at"]
+    return {
+        **fields,
+        "queued_for": (started_at or time.time()) - fields["created_at"],
+        "duration": (finished_at or time.time()) - started_at if started_at else None,
+    }
+
+
+class JobQueue:
+    """Runs submitted coroutines in the background and tracks their status.
+
+    Jobs with the same key run one at a time, in the order they were submitted;
+    jobs with different keys run concurrently.
+
+    Once connected, jobs are submitted through Redis and only the process that
+    `consume`s runs them, so the per-key ordering holds across processes. Their
+    status is kept in Redis too, for any process to look up. The coroutine
+    functions of such jobs are registered with `task`.
+    """
+
+    def __init__(
+        self, max_pending: int = MAX_PENDING_JOBS, keep_finished: int = KEEP_FINISHED
+    ):
+        self._max_pending = max_pending
+        self._keep_finished = keep_finished
+        self._jobs = collections.OrderedDict()
+        self._locks = {}
+        self._pending = 0
+        self._tasks = {}
+        self._redis = None
+        self._consumer = None
+
+    def task(self, coro_func):
+        """Decorator registering a coroutine function jobs can be submitted for."""
+        self._tasks[coro_func.__name__] = coro_func
+        return coro_func
+
+    def submit(self, name: str, key: str, coro_func, *args) -> Job:
+        """Runs a job in this process."""
+        if self._pending >= self._max_pending:
+            raise QueueFull(f"{self._pending} jobs are already pending")
+
+        job = Job(name, key)
+        self._start(job, coro_func, args)
+        return job
+
+    def _start(self, job: Job, coro_func, args):
+        self._jobs[job.id] = job
+        self._pending += 1
+        asyncio.ensure_future(self._run(job, coro_func, args))
+
+    async def enqueue(self, name: str, key: str, coro_func, *args) -> Job:
+        """Submits a job to the process running them, this one if not connected."""
+        if self._redis is None or self._consumer is not None:
+            return self.submit(name, key, coro_func, *args)
+
+        if self._tasks.get(coro_func.__name__) is not coro_func:
+            raise ValueError(f"{coro_func.__name__} isn't registered as a task")
+        submitted = await self._redis.llen(SUBMITTED_KEY)
+        if submitted >= self._max_pending:
+            raise QueueFull(f"{submitted} jobs are already submitted")
+
+        job = Job(name, key)
+        await self._save(job)
+        message = {"job": job.fields(), "task": coro_func.__name__, "args": args}
+        await self._redis.rpush(SUBMITTED_KEY, json.dumps(message))
+        return job
+
+    async def connect(self, consume: bool, url: str = REDIS_URL):
+        self._redis = await aioredis.create_redis_pool(url)
+        if consume:
+            # blocking pops take over a connection, so it gets its own
+            connection = await aioredis.create_redis(url)
+            self._consumer = asyncio.create_task(self._consume(connection))
+
+    async def _consume(self, connection):
+        try:
+            while True:
+                while self._pending >= self._max_pending:
+                    await asyncio.sleep(1)
+                _, raw = await connection.blpop(SUBMITTED_KEY, timeout=0)
+                try:
+                    message = json.loads(raw)
+                    job = Job(message["job"]["name"], message["job"]["key"])
+                    job.id = message["job"]["id"]
+                    job.created_at = message["job"]["created_at"]
+                    self._start(job, self._tasks[message["task"]], message["args"])
+                except Exception:
+                    logger.exception("can't run submitted job %r", raw[:200])
+        finally:
+            connection.close()
+
+    async def close(self):
+        if self._consumer is not None:
+            self._consumer.cancel()
+            await asyncio.gather(self._consumer, return_exceptions=True)
+            self._consumer = None
+        if self._redis is not None:
+            self._redis.close()
+            await self._redis.wait_closed()
+            self._redis = None
+
+    async def _save(self, job: Job):
+        if self._redis is None:
+            return
+        try:
+            await self._redis.set(
+                JOB_KEY.format(job.id), json.dumps(job.fields()), expire=JOB_TTL
+            )
+        except Exception:
+            logger.exception("saving the status of job %s failed", job.id)
+
+    async def _run(self, job: Job, coro_func, args):
+        lock = self._locks.setdefault(job.key, asyncio.Lock())
+        try:
+            await self._save(job)
+            async with lock:
+                job.status = "running"
+                job.started_at = time.time()
+                await self._save(job)
+                try:
+                    await coro_func(*args)
+                except Exception as ex:
+                    logger.exception("job %s (%s) failed", job.name, job.id)
+                    job.status = "failed"
+                    job.error = repr(ex)
+                else:
+                    job.status = "done"
+                finally:
+                    job.finished_at = time.time()
+                    await self._save(job)
+        finally:
+            self._pending -= 1
+            self._evict()
+
+    def _evict(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[: max(0, len(finished) - self._keep_finished)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Job:
+        return self._jobs.get(job_id)
+
+    async def status(self, job_id: str) -> dict:
+        """A job's status, wherever it was submitted or runs, None if unknown."""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job.json()
+        if self._redis is not None:
+            raw = await self._redis.get(JOB_KEY.format(job_id), encoding="utf-8")
+            if raw is not None:
+                return _describe(json.loads(raw))
+        return None
+
+    @property
+    def stats(self):
+        return {
+            "pending": self._pending,
+            "max_pending": self._max_pending,
+            "jobs": [job.json() for job in reversed(self._jobs.values())],
+        }
@@ -0,0 +1,71 @@
+import bisect
+import time
+
+from aiohttp import web
+
+# upper bounds of the latency buckets, in milliseconds
+BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000]
+
+
+class LatencyHistogram:
+    """Counts of request latencies per bucket, cumulative since startup."""
+
+    __slots__ = ("counts", "total", "sum")
+
+    def __init__(self):
+        # the last count is for latencies above the largest bucket
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, ms: float):
+        self.counts[bisect.bisect_left(BUCKETS, ms)] += 1
+        self.total += 1
+        self.sum += ms
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket the `q` quantile falls in, None if unbounded."""
+        rank = q * self.total
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+    def json(self):
+        return {
+            "count": self.total,
+            "mean_ms": self.sum / self.total if self.total else None,
+            "p50_ms": self.quantile(0.5),
+            "p90_ms": self.quantile(0.9),
+            "p99_ms": self.quantile(0.99),
+            "buckets": {
+                **{f"le_{bound}": count for bound, count in zip(BUCKETS, self.counts)},
+                "inf": self.counts[-1],
+            },
+        }
+
+
+# "METHOD route" -> LatencyHistogram
+latencies = {}
+
+
+@web.middleware
+async def latency_middleware(request: web.Request, handler):
+    """Records how long each route takes to respond, including errors."""
+    start = time.perf_counter()
+    try:
+        return await handler(request)
+    finally:
+        resource = request.match_info.route.resource
+        if resource is not None:
+            key = f"{request.method} {resource.canonical}"
+            histogram = latencies.get(key)
+            if histogram is None:
+                histogram = latencies[key] = LatencyHistogram()
+            histogram.observe((time.perf_counter() - start) * 1000)
+
+
+def latency_stats():
+    return {key: histogram.json() for key, histogram in sorted(latencies.items())}
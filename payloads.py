@@ -0,0 +1,43 @@
+import gzip
+import hashlib
+import json
+
+from aiohttp import web
+
+
+class Payload:
+    """A JSON response body serialized and compressed once, served many times."""
+
+    __slots__ = ("body", "gzipped", "etag")
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.gzipped = gzip.compress(body, compresslevel=6)
+        self.etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+
+    @classmethod
+    def from_data(cls, data):
+        # same serialization as web.json_response
+        return cls(json.dumps(data).encode())
+
+
+def etag_matches(request: web.Request, etag: str) -> bool:
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match is None:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def payload_response(request: web.Request, payload: Payload) -> web.Response:
+    """Responds with `payload`, gzipped if accepted, or 304 if the client has it."""
+    headers = {"ETag": payload.etag, "Vary": "Accept-Encoding"}
+    if etag_matches(request, payload.etag):
+        return web.Response(status=304, headers=headers)
+
+    if "gzip" in request.headers.get("Accept-Encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        body = payload.gzipped
+    else:
+        body = payload.body
+    return web.Response(body=body, content_type="application/json", headers=headers)
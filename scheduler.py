@@ -0,0 +1,161 @@
+import asyncio
+import collections
+import logging
+import time
+
+import aiocron
+
+logger = logging.getLogger(__name__)
+
+# heavy jobs running at the same time, at most; one, so e.g. the 02:00 gap fill
+# and the 04:00 bucket rebuild never overlap, however long either takes
+MAX_HEAVY_JOBS = 1
+# heavy jobs start at least this many seconds apart
+HEAVY_STAGGER = 60
+# runs kept per job for /jobs
+KEEP_RUNS = 20
+
+
+class ScheduledJob:
+    def __init__(
+        self, name: str, spec: str, heavy: bool, group: str = "jobs", func=None
+    ):
+        self.name = name
+        self.spec = spec
+        self.heavy = heavy
+        self.group = group
+        # runs the job right away, still guarded like a scheduled run; arguments
+        # are passed on, crons call it without any
+        self.func = func
+        self.cron = None
+        self.running = False
+        self.skipped = 0
+        self.runs = collections.deque(maxlen=KEEP_RUNS)
+
+    def json(self):
+        return {
+            "name": self.name,
+            "spec": self.spec,
+            "heavy": self.heavy,
+            "group": self.group,
+            "started": self.cron is not None,
+            "running": self.running,
+            "skipped": self.skipped,
+            "runs": list(self.runs),
+        }
+
+
+class Scheduler:
+    """Registers crons, so that no job overlaps with its own previous run.
+
+    Heavy jobs (bulk Yahoo fetches, re-aggregations) additionally wait for a slot
+    among MAX_HEAVY_JOBS, and start at least HEAVY_STAGGER seconds apart. A job
+    can return the number of items it processed, or a dict of "items" and
+    "failed", which is recorded with the run.
+
+    Crons only start ticking once their group is started, so each process can
+    pick the groups it runs, e.g. ingestion jobs in the worker process only.
+    """
+
+    def __init__(self, max_heavy: int = MAX_HEAVY_JOBS, stagger: float = HEAVY_STAGGER):
+        self._jobs = {}
+        self._heavy = None
+        self._max_heavy = max_heavy
+        self._stagger = stagger
+        self._last_heavy_start = 0.0
+        self._started = set()
+
+    def cron(
+        self, spec: str, name: str = None, heavy: bool = False, group: str = "jobs"
+    ):
+        """Decorator like aiocron.crontab, returning the ScheduledJob."""
+
+        def decorator(func):
+            job_name = name or func.__name__
+
+            async def run(*args, **kwargs):
+                return await self.run(job, func, *args, **kwargs)
+
+            job = self._jobs[job_name] = ScheduledJob(job_name, spec, heavy, group, run)
+            if group in self._started:
+                self._start(job)
+            return job
+
+        return decorator
+
+    def start(self, group: str = "jobs"):
+        """Starts the crons of `group`, including ones registered later on."""
+        self._started.add(group)
+        for job in self._jobs.values():
+            if job.group == group and job.cron is None:
+                self._start(job)
+
+    def _start(self, job: ScheduledJob):
+        # created here rather than on import, so the crons run on the loop of
+        # whoever starts them
+        job.cron = aiocron.crontab(job.spec, func=job.func, start=True)
+
+    def stop(self):
+        for job in self._jobs.values():
+            if job.cron is not None:
+                job.cron.stop()
+                job.cron = None
+        self._started.clear()
+
+    async def run(self, job: ScheduledJob, func, *args, **kwargs):
+        if job.running:
+            job.skipped += 1
+            logger.warning("skipping %s, its previous run is still going", job.name)
+            return None
+
+        job.running = True
+        record = {"started_at": time.time(), "waited": 0.0}
+        job.runs.append(record)
+        start = None
+        try:
+            if job.heavy:
+                await self._heavy_slot().acquire()
+            try:
+                if job.heavy:
+                    # the start is reserved before sleeping, so heavy jobs waiting
+                    # at the same time get successive slots
+                    start_at = max(time.time(), self._last_heavy_start + self._stagger)
+                    self._last_heavy_start = start_at
+                    delay = start_at - time.time()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+
+                start = time.time()
+                record["waited"] = start - record["started_at"]
+                result = await func(*args, **kwargs)
+                record["status"] = "done"
+                if isinstance(result, dict):
+                    record.update(result)
+                elif isinstance(result, int):
+                    record["items"] = result
+                return result
+            finally:
+                if job.heavy:
+                    self._heavy_slot().release()
+        except Exception as ex:
+            logger.exception("scheduled job %s failed", job.name)
+            record["status"] = "failed"
+            record["error"] = repr(ex)
+        finally:
+            job.running = False
+            record["finished_at"] = time.time()
+            if start is not None:
+                record["duration"] = record["finished_at"] - start
+
+    def _heavy_slot(self):
+        # created lazily, so it's bound to the loop the jobs run on
+        if self._heavy is None:
+            self._heavy = asyncio.Semaphore(self._max_heavy)
+        return self._heavy
+
+    @property
+    def stats(self):
+        return [job.json() for job in self._jobs.values()]
+
+
+scheduler = Scheduler()
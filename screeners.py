@@ -0,0 +1,136 @@
+import asyncio
+
+from bson import json_util
+
+from payloads import Payload
+from strategies import STRATEGIES
+
+
+def _collection(slug: str) -> str:
+    return slug.replace("-", "_")
+
+
+class _Row:
+    __slots__ = ("data", "overridden", "fragment")
+
+    def __init__(self, symbol: str, data: dict, overridden):
+        self.data = data
+        # attrs the strategy's own fundamentals take precedence for
+        self.overridden = overridden
+        self.fragment = None
+        self.serialize(symbol)
+
+    def serialize(self, symbol: str):
+        self.fragment = json_util.dumps({"symbol": symbol, "data": self.data})
+
+
+class _Screener:
+    __slots__ = ("meta", "rows", "payload")
+
+    def __init__(self, meta: str, rows: dict):
+        self.meta = meta
+        self.rows = rows
+        self.payload = None
+
+
+class ScreenerPayloads:
+    """Materialized /screener/{slug} responses for every strategy.
+
+    Each row is serialized once, and the response is assembled from the row
+    fragments into a Payload. Market cap updates re-serialize only the rows they
+    change before reassembling.
+    """
+
+    def __init__(self, db):
+        self._db = db
+        self._screeners = {}
+        self._common_meta = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def _strategies(self):
+        return self._db.db.strategies
+
+    async def get(self, slug: str) -> Payload:
+        """The payload of a strategy's screener, None for unknown slugs."""
+        if slug not in [strategy.slug for strategy in STRATEGIES.values()]:
+            return None
+        if slug not in self._screeners:
+            async with self._lock:
+                # may have been built while waiting for the lock
+                if slug not in self._screeners:
+                    await self._rebuild([slug])
+        return self._screeners[slug].payload
+
+    async def _load_fundamentals(self, collection: str):
+        return [
+            (stock["symbol"], stock.get("fundamentals", {}))
+            async for stock in self._strategies[collection].find(
+                {}, {"symbol": 1, "fundamentals": 1}
+            )
+        ]
+
+    async def rebuild(self, slugs=None):
+        """Rebuilds the given screeners, or all of them."""
+        async with self._lock:
+            await self._rebuild(
+                slugs or [strategy.slug for strategy in STRATEGIES.values()]
+            )
+
+    async def _rebuild(self, slugs):
+        self._common_meta = json_util.dumps(
+            await self._strategies.find_one({"slug": "all-stocks"})
+        )
+        all_stocks = dict(await self._load_fundamentals("all_stocks"))
+        for slug in slugs:
+            screener = await self._build(slug, all_stocks)
+            self._assemble(screener)
+            self._screeners[slug] = screener
+
+    async def _build(self, slug: str, all_stocks: dict) -> _Screener:
+        strategy = next(
+            (strategy for strategy in STRATEGIES.values() if strategy.slug == slug),
+            None,
+        )
+        attrs = strategy.precedented_attrs if strategy is not None else []
+
+        rows = {}
+        for symbol, fundamentals in await self._load_fundamentals(_collection(slug)):
+            if symbol not in all_stocks:
+                continue
+            overridden = {
+                key: fundamentals[key] for key in attrs if key in fundamentals
+            }
+            rows[symbol] = _Row(
+                symbol, {**all_stocks[symbol], **overridden}, set(overridden)
+            )
+
+        meta = json_util.dumps(await self._strategies.find_one({"slug": slug}))
+        return _Screener(meta, rows)
+
+    def _assemble(self, screener: _Screener):
+        # byte for byte what json_util.dumps of the whole response would give
+        screener.payload = Payload(
+            (
+                f'{{"meta": {screener.meta}, "stocks": ['
+                + ", ".join(row.fragment for row in screener.rows.values())
+                + f'], "common_meta": {self._common_meta}}}'
+            ).encode()
+        )
+
+    async def patch(self, changes: dict):
+        """Applies {symbol: {attr: value}} changes of all-stocks fundamentals."""
+        async with self._lock:
+            for screener in self._screeners.values():
+                changed = False
+                for symbol, values in changes.items():
+                    row = screener.rows.get(symbol)
+                    if row is None:
+                        continue
+                    for key, value in values.items():
+                        if key not in row.overridden:
+                            row.data[key] = value
+                    row.serialize(symbol)
+                    changed = True
+                if changed:
+                    self._assemble(screener)
@@ -0,0 +1,123 @@
+import asyncio
+import base64
+import datetime
+import random
+import time
+
+import aiohttp
+import click
+
+import timeseries.today
+from timeseries.decoder import (
+    decode,
+    decode_frames,
+    decode_pricing_data,
+    decode_pricing_data_protobuf,
+)
+from timeseries.PricingData_pb2 import PricingData
+from timeseries.stream import STREAM_URL
+from timeseries.today import MarketClock, TickerManager
+
+
+def synthesize(count, symbols=500):
+    names = [f"SYM{i}" for i in range(symbols)]
+    now = time.time()
+    frames = []
+    for i in range(count):
+        pd = PricingData()
+        pd.id = random.choice(names)
+        pd.price = 100 + random.random() * 10
+        pd.time = int((now + i * 0.001) * 1000)
+        pd.currency = "USD"
+        pd.exchange = "NMS"
+        pd.quoteType = PricingData.EQUITY
+        pd.marketHours = PricingData.REGULAR_MARKET
+        pd.changePercent = random.random()
+        pd.dayVolume = 1000 + i
+        pd.change = random.random()
+        pd.priceHint = 2
+        frames.append(base64.b64encode(pd.SerializeToString()).decode())
+    return frames
+
+
+async def record(symbols, seconds):
+    frames = []
+    async with aiohttp.ClientSession() as session:
+        async with session.ws_connect(STREAM_URL, heartbeat=300) as ws:
+            await ws.send_json({"subscribe": symbols})
+            deadline = time.time() + seconds
+            while time.time() < deadline:
+                try:
+                    msg = await ws.receive(timeout=deadline - time.time())
+                except asyncio.TimeoutError:
+                    break
+                frames.append(msg.data)
+    return frames
+
+
+def timed(label, count, func):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {count / elapsed:>12,.0f} msgs/sec")
+
+
+@click.command()
+@click.option("--capture", type=click.Path(), help="file of base64 frames, one a line")
+@click.option("--record-seconds", type=int, help="record the live stream to --capture")
+@click.option("--symbols", default="AAPL,MSFT,AMZN,TSLA,NVDA,SPY,QQQ")
+@click.option("--count", default=100000, help="synthesized frames without a capture")
+def bench_quote_decode(capture, record_seconds, symbols, count):
+    """Compares per-message and batched decoding of quote stream frames."""
+    if capture and record_seconds:
+        frames = asyncio.run(record(symbols.split(","), record_seconds))
+        with open(capture, "w") as f:
+            f.write("\n".join(frames))
+        print(f"recorded {len(frames)} frames to {capture}")
+    elif capture:
+        with open(capture) as f:
+            frames = f.read().split()
+    else:
+        frames = synthesize(count)
+
+    raw = [base64.b64decode(frame) for frame in frames]
+    n = len(frames)
+    print(f"{n} frames, protobuf backend: {decode.__name__}")
+
+    timed(
+        "protobuf ParseFromString",
+        n,
+        lambda: [PricingData().ParseFromString(b) for b in raw],
+    )
+    timed(
+        "protobuf decode to tuple",
+        n,
+        lambda: [decode_pricing_data_protobuf(b) for b in raw],
+    )
+    timed(
+        "hand-written decode to tuple", n, lambda: [decode_pricing_data(b) for b in raw]
+    )
+
+    # end to end, as the stream used to apply quotes and as it does now
+    timeseries.today.market_clock = MarketClock(
+        datetime.time(0), datetime.time(23, 59, 59, 999999)
+    )
+    manager = TickerManager()
+    manager.set_symbols(sorted({decode_pricing_data(b)[0] for b in raw}))
+
+    async def per_message():
+        for frame in frames:
+            pd = PricingData()
+            pd.ParseFromString(base64.b64decode(frame))
+            await manager.on_quote(pd)
+
+    timed("per message decode + await on_quote", n, lambda: asyncio.run(per_message()))
+    timed(
+        "batched decode_frames + on_quotes",
+        n,
+        lambda: manager.on_quotes(decode_frames(frames)),
+    )
+
+
+if __name__ == "__main__":
+    bench_quote_decode()
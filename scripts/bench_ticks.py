@@ -0,0 +1,62 @@
+import asyncio
+import datetime
+import random
+import time
+
+import click
+
+import timeseries.today
+from timeseries.PricingData_pb2 import PricingData
+from timeseries.today import MarketClock, TickerManager
+
+
+def make_ticks(symbols, count):
+    now = time.time()
+    ticks = []
+    for i in range(count):
+        pd = PricingData()
+        pd.id = random.choice(symbols)
+        pd.price = 100 + random.random() * 10
+        pd.time = int((now + i * 0.001) * 1000)
+        pd.dayVolume = 1000 + i
+        pd.marketHours = PricingData.REGULAR_MARKET
+        ticks.append(pd)
+    return ticks
+
+
+async def replay(manager, ticks):
+    start = time.perf_counter()
+    for pd in ticks:
+        await manager.on_quote(pd)
+    return time.perf_counter() - start
+
+
+@click.command()
+@click.option("--symbols", default=6000, help="number of subscribed symbols")
+@click.option("--ticks", default=200000, help="number of ticks to replay")
+@click.option(
+    "--session/--no-session",
+    default=True,
+    help="replay as if the regular session is open, regardless of the time",
+)
+def bench_ticks(symbols, ticks, session):
+    """Measures ticks/sec through TickerManager.on_quote."""
+    if session:
+        timeseries.today.market_clock = MarketClock(
+            datetime.time(0), datetime.time(23, 59, 59, 999999)
+        )
+
+    names = [f"SYM{i}" for i in range(symbols)]
+    manager = TickerManager()
+    manager.set_symbols(names)
+    replayed = make_ticks(names, ticks)
+
+    elapsed = asyncio.run(replay(manager, replayed))
+    print(
+        f"{ticks} ticks over {symbols} symbols in {elapsed:.3f}s:"
+        f" {ticks / elapsed:,.0f} ticks/sec"
+    )
+
+
+if __name__ == "__main__":
+    bench_ticks()
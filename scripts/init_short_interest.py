@@ -6,12 +6,34 @@ import click
 import numpy
 import pandas
 
+from events import events
 from timeseries.db import store_short_interest
+from timeseries.writer import close_writers
+from versions import versions
+
+
+async def connect():
+    await versions.connect()
+    await events.connect(subscribe=False)
+
+
+async def disconnect():
+    await events.close()
+    await versions.close()
 
 
 @click.command()
 @click.argument("csv")
 def import_csv(csv):
+    loop = asyncio.get_event_loop()
+    # the running API processes learn about the import over Redis
+    try:
+        loop.run_until_complete(connect())
+    except Exception as ex:
+        print(
+            "Redis unavailable, API processes won't see the import until restarted", ex
+        )
+
     df = pandas.read_csv(csv)
     points = []
     for i, row in df.iterrows():
@@ -64,12 +86,20 @@ def import_csv(csv):
 
     chunk_size = 10000
 
+    published = []
     for i in range(math.ceil(len(points) / chunk_size)):
-        asyncio.get_event_loop().run_until_complete(
-            store_short_interest(points[i * chunk_size : (i + 1) * chunk_size])
+        published.append(
+            loop.run_until_complete(
+                store_short_interest(points[i * chunk_size : (i + 1) * chunk_size])
+            )
         )
         print("pushing points", i * chunk_size, (i + 1) * chunk_size)
 
+    # writes are queued, make sure they are all out and announced before exiting
+    loop.run_until_complete(close_writers())
+    loop.run_until_complete(asyncio.gather(*published))
+    loop.run_until_complete(disconnect())
+
 
 if __name__ == "__main__":
     import_csv()
@@ -0,0 +1,42 @@
+"""Serves the API from API_WORKERS processes, all listening on PORT.
+
+This process streams the live tickers and shares them through shared memory with
+the API processes, which bind the port with SO_REUSEPORT. It runs the crons too,
+unless ROLE says otherwise, e.g. ROLE=ingester with worker.py running elsewhere.
+"""
+import multiprocessing
+import os
+import time
+
+from aiohttp import web
+
+from versions import EPOCH_ENV
+
+API_WORKERS = int(os.environ.get("API_WORKERS") or os.cpu_count())
+
+
+def serve_api(port: int):
+    os.environ["ROLE"] = "api"
+    os.environ["TICKERS"] = "shared"
+    import server
+
+    web.run_app(server.app, port=port, reuse_port=True)
+
+
+if __name__ == "__main__":
+    port = 8080
+    try:
+        port = int(os.environ.get("PORT"))
+    except (ValueError, TypeError):
+        pass
+
+    os.environ.setdefault("ROLE", "ingester,worker")
+    # one epoch for the version stamps of every process started here
+    os.environ.setdefault(EPOCH_ENV, f"{os.urandom(8).hex()}:{time.time()}")
+    import worker
+
+    # spawned, so the API processes import the server with their own environment
+    context = multiprocessing.get_context("spawn")
+    for _ in range(API_WORKERS):
+        context.Process(target=serve_api, args=(port,), daemon=True).start()
+    worker.main()
@@ -3,24 +3,32 @@ import datetime
 import json
 import logging
 import os
-import time
 
-import aiocron
 import aiohttp
 import lxml.html
 from aiohttp import web
 from bson import json_util
 from dotenv import load_dotenv
+from pymongo import UpdateOne
 
 from cache import Cache
+from conditional import conditional_middleware
 from db import DB
+from events import events
 from FMP import FinancialModelingPrep
 from investor_deck import InvestorDeck
+from jobs import JobQueue, QueueFull
+from metrics import latency_middleware, latency_stats
+from payloads import payload_response
+from scheduler import scheduler
+from screeners import ScreenerPayloads
 from strategies import STRATEGIES, Strategy
+from symbol_search import SymbolSearch
 from timeseries.buckets import get_data_to_aggregate, update_buckets
+from timeseries.candle_cache import candle_cache
 from timeseries.cron import create_crontabs, update_data
+from timeseries.dashboard import dashboard_payloads
 from timeseries.db import (
-    get_all_bucket_candles,
     get_bucket_candles,
     get_candles,
     get_day_coverage,
@@ -29,11 +37,16 @@ from timeseries.db import (
     get_short_interest,
     get_stocklist_candles,
     influx_res_to_dict,
+    load_period_candles,
     store_short_interest,
 )
 from timeseries.gapFill import fillGaps
+from timeseries.periods import period_candles
+from timeseries.shared_tickers import SharedTickerReader, SharedTickerWriter
 from timeseries.today import TickerManager
+from timeseries.writer import close_writers, writer_stats
 from timeseries.yahoo_finance import Interval, YahooFinance
+from versions import versions
 
 load_dotenv()
 logging.basicConfig(
@@ -42,6 +55,29 @@ logging.basicConfig(
 
 db = DB()
 tickermanager = TickerManager()
+screener_payloads = ScreenerPayloads(db)
+symbol_search = SymbolSearch()
+# initialized on first use, so crons can use it in any role
+cache = Cache()
+jobs = JobQueue()
+TICKER_STATE_KEY = "tickers:state"
+LOCKUP_CACHE_KEY = "lockup:table"
+# symbols a single /news request may ask for
+MAX_NEWS_SYMBOLS = 20
+# the parsed lockup table is reused for this long, e.g. across restarts
+LOCKUP_TTL = datetime.timedelta(hours=12)
+# comma separated parts this process plays: "api" serves requests, "worker" runs
+# the ingestion and aggregation crons (see worker.py), "ingester" streams the live
+# tickers and shares them with API processes (see serve.py), "all" is api and
+# worker in one process
+ROLE = os.environ.get("ROLE", "all")
+ROLES = set(ROLE.split(","))
+SERVES_API = bool(ROLES & {"all", "api"})
+RUNS_JOBS = bool(ROLES & {"all", "worker"})
+# TICKERS=shared API processes read the live tickers an ingester shares, rather
+# than streaming them themselves
+SHARED_TICKERS = os.environ.get("TICKERS") == "shared"
+INGESTS_TICKERS = "ingester" in ROLES or (SERVES_API and not SHARED_TICKERS)
 routes = web.RouteTableDef()
 
 try:
@@ -103,26 +139,14 @@ async def get_stock_quotes(request):
                     "volume": None,
                 }
 
-            if interval == "1wk":
-                try:
-                    patched_candle = await get_period_OHLV(interval, symbol)
-                    patched_candle["close"] = day_candle["close"]
-                    print(patched_candle)
-                except KeyError:
-                    patched_candle = {
-                        "timestamp": None,
-                        "open": None,
-                        "high": None,
-                        "low": None,
-                        "close": None,
-                        "volume": None,
-                    }
+            if interval in ["1wk", "1mo"] and period_candles.ready:
+                patched_candle = period_candles.get(interval, symbol, day_candle)
 
-            elif interval == "1mo":
+            elif interval in ["1wk", "1mo"]:
+                # period candles are still loading, query them
                 try:
                     patched_candle = await get_period_OHLV(interval, symbol)
                     patched_candle["close"] = day_candle["close"]
-
                 except KeyError:
                     patched_candle = {
                         "timestamp": None,
@@ -133,14 +157,6 @@ async def get_stock_quotes(request):
                         "volume": None,
                     }
 
-            # if first day of month, won't have data in db yet, so use day candle
-            if interval == "1mo" and datetime.date.today() == 1:
-                patched_candle = day_candle
-
-            # if first day of week, won't have data in db yet, so use day candle
-            if interval == "1wk" and datetime.datetime.today().weekday() == 0:
-                patched_candle = day_candle
-
             if interval == "1d":
                 patched_candle = day_candle
 
@@ -236,17 +252,14 @@ async def dashboard_candles(request):
             {"error": "Invalid date format: Use ISO format YYYY-MM-DD"}
         )
 
-    bucket_candles = await get_all_bucket_candles(start, end)
-
-    spy = await get_candles(start=start, end=end, symbol="SPY", interval="1d")
-
-    bucket_candles["spy"] = spy
-    return web.json_response(bucket_candles)
+    return payload_response(request, await dashboard_payloads.get(start, end))
 
 
 @routes.get("/today-debug")
 async def get_today_ohlcv(request):
-    return web.json_response(tickermanager.get_all_ohlcv())
+    return web.Response(
+        text=tickermanager.get_all_ohlcv_json(), content_type="application/json"
+    )
 
 
 @routes.get("/today-debug/{ticker}")
@@ -254,6 +267,45 @@ async def get_today_ohlcv_ticker(request):
     return web.json_response(tickermanager.get_ohlcv(request.match_info["ticker"]))
 
 
+@routes.get("/stream")
+async def stream_quotes(request):
+    """Server-sent events with live day candles for `symbols` (comma separated)."""
+    symbols = [
+        symbol.strip().upper()
+        for symbol in request.query.get("symbols", "").split(",")
+        if symbol.strip()
+    ]
+    if not symbols:
+        return web.json_response({"error": "No symbols given"}, status=400)
+
+    response = web.StreamResponse(
+        headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"}
+    )
+    await response.prepare(request)
+
+    fanout = tickermanager.fanout
+    subscriber = fanout.subscribe(symbols)
+    try:
+        for symbol in symbols:
+            payload = fanout.render(symbol)
+            if payload is not None:
+                await response.write(payload)
+
+        while not subscriber.overflowed:
+            try:
+                payload = await asyncio.wait_for(subscriber.queue.get(), timeout=15)
+            except asyncio.TimeoutError:
+                # keep proxies from closing an idle connection
+                payload = b": ping\n\n"
+            await response.write(payload)
+    except ConnectionResetError:
+        pass
+    finally:
+        fanout.unsubscribe(subscriber)
+
+    return response
+
+
 async def get_last_points(symbols):
     res = {}
     for symbol in symbols:
@@ -284,6 +336,36 @@ async def update_symbol_data(request):
     return await get_last_point_symbol(request)
 
 
+@routes.get("/debug/quote-stream")
+async def get_quote_stream_stats(request):
+    return web.json_response(tickermanager.stream_stats)
+
+
+@routes.get("/debug/stream")
+async def get_stream_stats(request):
+    return web.json_response(tickermanager.fanout.stats)
+
+
+@routes.get("/debug/bootstrap")
+async def get_bootstrap_stats(request):
+    return web.json_response(tickermanager.bootstrap_stats)
+
+
+@routes.get("/debug/candle-cache")
+async def get_candle_cache_stats(request):
+    return web.json_response(candle_cache.stats)
+
+
+@routes.get("/debug/influx-writer")
+async def get_influx_writer_stats(request):
+    return web.json_response(writer_stats())
+
+
+@routes.get("/debug/latency")
+async def get_latency_stats(request):
+    return web.json_response(latency_stats())
+
+
 @routes.get("/debug-datecoverage")
 async def datecoverage(request):
 
@@ -345,6 +427,9 @@ async def handle(request):
 
 @routes.get("/screener/{slug}")
 async def screened_stocks(request):
+    payload = await screener_payloads.get(request.match_info["slug"])
+    if payload is not None:
+        return payload_response(request, payload)
     return web.json_response(
         await db.get_screened_stocks(request.match_info["slug"]), dumps=json_util.dumps
     )
@@ -353,22 +438,36 @@ async def screened_stocks(request):
 @routes.get("/meta/screener/{slug}")
 async def screener_meta(request):
     slug = request.match_info["slug"]
-    return web.json_response(
-        await db.db.strategies.find_one({"slug": slug}), dumps=json_util.dumps
-    )
+    return web.json_response(await db.get_strategy_meta(slug), dumps=json_util.dumps)
+
+
+async def get_cached_presentation_urls(cache, symbol):
+    key = f"presentations:{symbol}"
+    presentation_urls = await cache.getJSON(key)
+    if presentation_urls is None:
+        presentation_urls = await investorDeckApi.get_company_presentation_urls(symbol)
+        # the signed URLs expire, don't serve them past that; Redis expiries are
+        # whole seconds, and an expiry of 0 is refused
+        ttl = investorDeckApi.presentation_urls_ttl(presentation_urls)
+        if ttl >= datetime.timedelta(seconds=1):
+            await cache.setJSON(key, presentation_urls, expiry=ttl)
+    return presentation_urls
 
 
 @routes.get("/meta/{stock}/{screener}")
 async def screened_stock_details(request):
     stock = request.match_info["stock"].upper()
     screener_slug = request.match_info["screener"]
-    data = await db.get_stock_meta_for_strategy(stock, screener_slug)
-    try:
-        data["presentation_urls"] = await investorDeckApi.get_company_presentation_urls(
-            stock
-        )
-    except Exception:
-        data["presentation_urls"] = ""
+    data, presentation_urls = await asyncio.gather(
+        db.get_stock_meta_for_strategy(stock, screener_slug),
+        get_cached_presentation_urls(request.app["cache"], stock),
+        return_exceptions=True,
+    )
+    if isinstance(data, Exception):
+        raise data
+    data["presentation_urls"] = (
+        "" if isinstance(presentation_urls, Exception) else presentation_urls
+    )
     return web.json_response(
         data,
         dumps=json_util.dumps,
@@ -382,10 +481,16 @@ async def update_data_ipos():
         await update_data(interval, symbols)
 
 
+@jobs.task
 async def update_fundamentals(screener, csv):
     await db.update_fundamentals_data(screener, csv)
+    # every screener includes the all-stocks fundamentals
+    slug = STRATEGIES[int(screener)].slug
+    await publish_fundamentals(slugs=None if slug == "all-stocks" else [slug])
     if STRATEGIES[int(screener)].slug == "recently-listed":
         await update_data_ipos()
+    if STRATEGIES[int(screener)].slug == "all-stocks":
+        await events.publish("symbols")
 
 
 @routes.get("/debug/update-ipos")
@@ -394,26 +499,45 @@ async def update_ipos(request):
     return web.json_response({"status": "ok"})
 
 
+@jobs.task
+async def update_short_interest(csv):
+    strategy = Strategy.from_yml("short-interest")
+    stocks = await asyncio.get_event_loop().run_in_executor(
+        None, strategy.csv_to_db_object, csv
+    )
+    now = datetime.datetime.today()
+    snapped_timestamp = datetime.datetime(
+        day=15 if now.day >= 15 else 1, month=now.month, year=now.year
+    )
+    stocks = [{**stock, "timestamp": snapped_timestamp} for stock in stocks]
+    await store_short_interest(stocks)
+
+
 @routes.post("/fundamentals")
 async def update_fundamentals_data(request):
     json = await request.json()
-    print(json)
     csv = json["csv"]
     screener = json["screener"]
-    if int(screener) == 15:
-        # store short-interest timeseries
-        strategy = Strategy.from_yml("short-interest")
-        stocks = strategy.csv_to_db_object(csv)
-        now = datetime.datetime.today()
-        snapped_timestamp = datetime.datetime(
-            day=15 if now.day >= 15 else 1, month=now.month, year=now.year
-        )
-        stocks = [{**stock, "timestamp": snapped_timestamp} for stock in stocks]
-        asyncio.create_task(store_short_interest(stocks))
-    else:
-        asyncio.create_task(update_fundamentals(screener, csv))
-    return web.Response(
-        text="ok",
+    print(f"received fundamentals for screener {screener}, {len(csv)} bytes")
+    try:
+        if int(screener) == 15:
+            # store short-interest timeseries
+            job = await jobs.enqueue(
+                "short-interest", "screener:15", update_short_interest, csv
+            )
+        else:
+            job = await jobs.enqueue(
+                f"fundamentals {STRATEGIES[int(screener)].slug}",
+                f"screener:{int(screener)}",
+                update_fundamentals,
+                screener,
+                csv,
+            )
+    except QueueFull as ex:
+        return web.json_response({"error": str(ex)}, status=429)
+    return web.json_response(
+        {"status": "ok", "job": job.id},
+        status=202,
         # headers={
         # "Access-Control-Allow-Methods": "OPTIONS, GET, POST",
         # "Access-Control-Allow-Origin": "*",
@@ -422,29 +546,67 @@ async def update_fundamentals_data(request):
     )
 
 
+@routes.get("/jobs/{id}")
+async def get_job(request):
+    job = await jobs.status(request.match_info["id"])
+    if job is None:
+        return web.json_response({"error": "no such job"}, status=404)
+    return web.json_response(job)
+
+
+@routes.get("/jobs")
+async def get_jobs(request):
+    return web.json_response({"queue": jobs.stats, "scheduled": scheduler.stats})
+
+
+async def get_cached_news(app, symbol):
+    return await app["cache"].getCachedOrGetFromSourceAndCache(
+        f"news:{symbol}",
+        app["FMP"].get_interleaved_news(symbol),
+        expiry=datetime.timedelta(days=1),
+    )
+
+
 @routes.get("/news/{symbol}")
 async def get_stock_news(request):
-    cache = request.app["cache"]
-    FMP = request.app["FMP"]
-
     symbol = request.match_info["symbol"].upper()
-    cacheKey = f"news:{symbol.upper()}"
+    return web.json_response(await get_cached_news(request.app, symbol))
 
-    data = await cache.getCachedOrGetFromSourceAndCache(
-        cacheKey, FMP.get_interleaved_news(symbol), expiry=datetime.timedelta(days=1)
+
+@routes.get("/news")
+async def get_stocks_news(request):
+    """News of `symbols` (comma separated), by symbol."""
+    symbols = list(
+        dict.fromkeys(
+            symbol.strip().upper()
+            for symbol in request.query.get("symbols", "").split(",")
+            if symbol.strip()
+        )
     )
-    return web.json_response(data)
+    if not symbols:
+        return web.json_response({"error": "No symbols given"}, status=400)
+    if len(symbols) > MAX_NEWS_SYMBOLS:
+        return web.json_response(
+            {"error": f"At most {MAX_NEWS_SYMBOLS} symbols at once"}, status=400
+        )
+
+    news = await asyncio.gather(
+        *(get_cached_news(request.app, symbol) for symbol in symbols)
+    )
+    return web.json_response(dict(zip(symbols, news)))
 
 
 @routes.get("/sm")
 async def get_yahoo_symbols(request):
-    q = request.query.get("q")
-    async with aiohttp.ClientSession() as session:
-        async with session.get(
-            "https://query1.finance.yahoo.com/v1/finance/search",
-            params={"q": q, "quotesCount": 10},
-        ) as response:
-            return web.json_response(await response.json())
+    q = request.query.get("q", "")
+    if not q.strip():
+        return web.json_response({"error": "No query given"}, status=400)
+    return web.json_response(await symbol_search.search(q))
+
+
+@routes.get("/debug/symbol-search")
+async def get_symbol_search_stats(request):
+    return web.json_response(symbol_search.stats)
 
 
 # @routes.options("/fundamentals")
@@ -461,14 +623,62 @@ async def options_req(request):
 async def start_mongo(app):
     await db.init()
     print("mongo connected")
+    asyncio.create_task(screener_payloads.rebuild())
+
+
+async def publish_fundamentals(**data):
+    await versions.bump("fundamentals")
+    await events.publish("fundamentals", **data)
+
+
+@events.on("fundamentals")
+async def fundamentals_changed(slugs=None, changes=None):
+    """Either whole screeners were uploaded, or `changes` patch all-stocks rows."""
+    stamps = await versions.fetch("fundamentals")
+    if changes is not None:
+        await screener_payloads.patch(changes)
+    else:
+        await screener_payloads.rebuild(slugs)
+    versions.apply(stamps)
+
+
+@events.on("symbols")
+async def symbols_changed():
+    if INGESTS_TICKERS and "DEV" not in os.environ:
+        tickermanager.set_symbols(await db.get_symbols())
+
+
+async def connect_events(app):
+    # a single process handles its own events, split ones share them over Redis
+    if ROLE != "all":
+        await events.connect(subscribe=SERVES_API or INGESTS_TICKERS)
+        # and the version stamps, so they validate the same in every process
+        await versions.connect()
+        # upload jobs are run by the worker, whichever process took the upload
+        await jobs.connect(consume=RUNS_JOBS)
+
+
+async def close_events(app):
+    await events.close()
+    await versions.close()
+    await jobs.close()
+
+
+def start_scheduler(group):
+    async def _start(app):
+        scheduler.start(group)
+
+    return _start
 
 
 yf = YahooFinance()
 
 
 # at every hour from 8 to 16 from monday through friday
-@aiocron.crontab("0 8-16 * * 1-5")
+@scheduler.cron("0 8-16 * * 1-5", heavy=True)
 async def get_latest_price(stocks=["AAPL", "NVDA", "GOOG"]):
+    changes = {}
+    failed = 0
     async for stock in db.db.strategies.all_stocks.find(
         {}, {"symbol": 1, "fundamentals.shares_outstanding": 1}
     ):
@@ -482,42 +692,73 @@ async def get_latest_price(stocks=["AAPL", "NVDA", "GOOG"]):
                 {"symbol": symbol},
                 {"$set": {"fundamentals.market_cap": new_market_cap}},
             )
+            changes[symbol] = {"market_cap": new_market_cap}
             # print(f"updating {symbol}'s market_cap: {new_market_cap}")
 
         except Exception as e:
             print(f"price: {price}, shares_outstanding: {shares_outstanding}")
             print(f"Exception in updating market cap {e}")
+            failed += 1
+    await publish_fundamentals(changes=changes)
+    return {"items": len(changes), "failed": failed}
+
+
+# key statistics pages fetched at the same time by update_float_shares
+FLOAT_SHARES_CONCURRENCY = 8
 
 
 # once everyday
-@aiocron.crontab("0 0 * * *")
+@scheduler.cron("0 0 * * *", heavy=True)
 async def update_float_shares():
-    for symbol in await db.get_symbols():
-        try:
-            float_shares = await yf.get_key_statistic_float_shares(symbol)
-            if "raw" in float_shares:
-                await db.db.strategies.all_stocks.update_one(
-                    {"symbol": symbol},
-                    {"$set": {"fundamentals.float_shares": float_shares["raw"]}},
-                )
-            else:
-                logging.debug(f"no float shares data for {symbol}")
-                await db.db.strategies.all_stocks.update_one(
-                    {"symbol": symbol},
-                    {"$set": {"fundamentals.float_shares": None}},
+    symbols = await db.get_symbols()
+    semaphore = asyncio.Semaphore(FLOAT_SHARES_CONCURRENCY)
+
+    async with aiohttp.ClientSession(skip_auto_headers=["user-agent"]) as session:
+
+        async def fetch(symbol):
+            async with semaphore:
+                return await asyncio.wait_for(
+                    yf.get_key_statistic_float_shares(symbol, session), timeout=30.0
                 )
-        except Exception:
-            logging.exception(
-                f"exception occurred getting and setting float shares for {symbol}",
+
+        results = await asyncio.gather(
+            *(fetch(symbol) for symbol in symbols), return_exceptions=True
+        )
+
+    changes = {}
+    updates = []
+    failed = 0
+    for symbol, float_shares in zip(symbols, results):
+        if float_shares is None or isinstance(float_shares, Exception):
+            logging.error(
+                f"exception occurred getting float shares for {symbol}",
+                exc_info=float_shares,
             )
+            failed += 1
+            continue
+        if "raw" not in float_shares:
+            logging.debug(f"no float shares data for {symbol}")
+        changes[symbol] = {"float_shares": float_shares.get("raw")}
+        updates.append(
+            UpdateOne(
+                {"symbol": symbol},
+                {"$set": {"fundamentals.float_shares": float_shares.get("raw")}},
+            )
+        )
+
+    if updates:
+        await db.db.strategies.all_stocks.bulk_write(updates, ordered=False)
+    await publish_fundamentals(changes=changes)
+    return {"items": len(changes), "failed": failed}
 
 
 # refresh ticker after market open 9:30 EST
-def refresh_tickers_factory():
+def refresh_tickers_factory(skip_fresh=False):
     async def _wrapper():
         print(f"refreshing tickers at {datetime.datetime.now()}")
-        await tickermanager.bootstrap()
-        print(f"refreshing tickers finished at {datetime.datetime.now()}")
+        stats = await tickermanager.bootstrap(skip_fresh=skip_fresh)
+        print(f"refreshing tickers finished at {datetime.datetime.now()}", stats)
+        return {"items": stats["received"], "failed": stats["failed_symbols"]}
 
     return _wrapper
 
@@ -534,20 +775,31 @@ def clear_tickers_factory():
 async def schedule_tickermanager_actions(app):
 
     # Yahoo's endpoints have some instability after market open, so we refresh multiple times to eventually fill with
-    # correct values. Whole bootstrapping takes ~ 30 sec
-    aiocron.crontab("32 9 * * 1-5")(refresh_tickers_factory())
-    aiocron.crontab("0 10 * * 1-5")(refresh_tickers_factory())
+    # correct values. Every refresh fetches all symbols, a fresh streamed price
+    # doesn't mean the day's OHLCV is right
+    scheduler.cron("32 9 * * 1-5", name="refresh_tickers 9:32", group="tickers")(
+        refresh_tickers_factory()
+    )
+    scheduler.cron("0 10 * * 1-5", name="refresh_tickers 10:00", group="tickers")(
+        refresh_tickers_factory()
+    )
 
     # EOD snag all canonical values (remove drift caused by streaming price)
-    aiocron.crontab("05 16 * * 1-5")(refresh_tickers_factory())
-    aiocron.crontab("20 16 * * 1-5")(refresh_tickers_factory())
+    scheduler.cron("05 16 * * 1-5", name="refresh_tickers 16:05", group="tickers")(
+        refresh_tickers_factory()
+    )
+    scheduler.cron("20 16 * * 1-5", name="refresh_tickers 16:20", group="tickers")(
+        refresh_tickers_factory()
+    )
 
     # Clear last day's tickers.
-    aiocron.crontab("0 0 * * *")(clear_tickers_factory())
+    scheduler.cron("0 0 * * *", name="clear_tickers", group="tickers")(
+        clear_tickers_factory()
+    )
 
 
 # Reaggregate at 4 in the morning
-@aiocron.crontab("0 4 * * 1-5")
+@scheduler.cron("0 4 * * 1-5", heavy=True)
 async def reaggregate_buckets():
     await update_buckets(app=None, startover=True)
 
@@ -557,22 +809,68 @@ async def schedule_cron(app):
 
 
 # Fill gaps at 2 in the morning
-@aiocron.crontab("0 2 * * *")
+@scheduler.cron("0 2 * * *", heavy=True)
 async def schedule_gapFill():
     await fillGaps()
 
 
+def ticker_state_saver(cache):
+    async def _save(state):
+        await cache.setBytes(TICKER_STATE_KEY, state, expiry=datetime.timedelta(days=1))
+
+    return _save
+
+
+async def save_ticker_state(app):
+    await ticker_state_saver(app["cache"])(tickermanager.dump_state())
+
+
 async def start_tickermanager(app):
     tickermanager.set_symbols(await db.get_symbols())
-    start_time = time.time()
-    print(f"starting bootstrapping {start_time}, at {datetime.datetime.now()}")
-    await tickermanager.bootstrap()
-    print(f"bootstrapping finished in {time.time() - start_time} seconds")
+
+    # after a restart during the day, pick up the streamed state where we left off
+    # and only bootstrap the symbols that went stale in the meantime
+    restored = False
+    try:
+        state = await app["cache"].getBytes(TICKER_STATE_KEY)
+        restored = state is not None and tickermanager.restore_state(state)
+    except Exception as ex:
+        # unreadable or corrupt state, a full bootstrap gets everything anyway
+        print("restoring ticker state failed", ex)
+
+    print(f"starting bootstrapping at {datetime.datetime.now()}, restored {restored}")
+    stats = await tickermanager.bootstrap(skip_fresh=restored)
+    print(f"bootstrapping finished in {stats['duration']} seconds", stats)
     asyncio.create_task(tickermanager.start())
+    asyncio.create_task(tickermanager.persist_state(ticker_state_saver(app["cache"])))
+
+
+async def share_tickers(app):
+    writer = SharedTickerWriter()
+    writer.open()
+    app["ticker_writer"] = writer
+    asyncio.create_task(tickermanager.share(writer))
+
+
+async def close_ticker_writer(app):
+    app["ticker_writer"].close()
+
+
+async def follow_shared_tickers(app):
+    asyncio.create_task(tickermanager.follow(SharedTickerReader()))
+
+
+async def warm_period_candles(app):
+    async def _load():
+        try:
+            await load_period_candles()
+        except Exception as ex:
+            print("loading period candles failed", ex)
+
+    asyncio.create_task(_load())
 
 
 async def attach_cache(app):
-    cache = Cache()
     await cache.init()
     app["cache"] = cache
 
@@ -581,9 +879,26 @@ async def attach_fmp(app):
     app["FMP"] = FinancialModelingPrep(os.environ.get("FMP_KEY"))
 
 
-def init_cron(cron):
+async def close_fmp(app):
+    await app["FMP"].close()
+
+
+async def close_symbol_search(app):
+    await symbol_search.close()
+
+
+async def close_investor_deck(app):
+    if investorDeckApi != "MISSING":
+        await investorDeckApi.close()
+
+
+async def flush_influx_writers(app):
+    await close_writers()
+
+
+def init_cron(cron, **kwargs):
     async def _decorated(app):
-        asyncio.create_task(cron.func())
+        asyncio.create_task(cron.func(**kwargs))
 
     return _decorated
 
@@ -634,28 +949,111 @@ async def get_lockup_data():
             return data
 
 
-@aiocron.crontab("0 0 * * *")
-async def patch_lockup_data():
-    lockup_data = await get_lockup_data()
-    for datum in lockup_data:
-        symbol = datum["symbol"]
-        await db.db.strategies.all_stocks.update_one(
-            {"symbol": symbol},
-            {"$set": {"fundamentals.ipo_lockup_data": datum}},
+@scheduler.cron("0 0 * * *")
+async def patch_lockup_data(use_cached=False):
+    # only startups reuse a recent table, the daily run always fetches a fresh one
+    lockup_data = await cache.getJSON(LOCKUP_CACHE_KEY) if use_cached else None
+    if lockup_data is None:
+        lockup_data = await get_lockup_data()
+        if not lockup_data:
+            print("no lockup data fetched, keeping the stored data")
+            return 0
+        await cache.setJSON(LOCKUP_CACHE_KEY, lockup_data, expiry=LOCKUP_TTL)
+
+    # only rows that differ from what's stored are written
+    lockups = {datum["symbol"]: datum for datum in lockup_data}
+    stored = {
+        stock["symbol"]: stock.get("fundamentals", {}).get("ipo_lockup_data")
+        async for stock in db.db.strategies.all_stocks.find(
+            {"symbol": {"$in": list(lockups)}},
+            {"symbol": 1, "fundamentals.ipo_lockup_data": 1},
         )
-
-
-app = web.Application(client_max_size=1024 * 1000 * 10)
-app.on_startup.append(start_mongo)
-app.on_startup.append(attach_cache)
-app.on_startup.append(attach_fmp)
-
-if "DEV" not in os.environ:
-    app.on_startup.append(schedule_cron)
+    }
+    changed = {
+        symbol: datum
+        for symbol, datum in lockups.items()
+        if symbol in stored and stored[symbol] != datum
+    }
+
+    if changed:
+        await db.db.strategies.all_stocks.bulk_write(
+            [
+                UpdateOne(
+                    {"symbol": symbol},
+                    {"$set": {"fundamentals.ipo_lockup_data": datum}},
+                )
+                for symbol, datum in changed.items()
+            ],
+            ordered=False,
+        )
+        await publish_fundamentals(
+            changes={
+                symbol: {"ipo_lockup_data": datum} for symbol, datum in changed.items()
+            },
+        )
+    return len(changed)
+
+
+def quotes_depends_on(request):
+    # the patched latest candle changes with every tick, intraday bars with every
+    # minute
+    if "latest" in request.query or request.query.get("interval") not in [
+        "1d",
+        "1wk",
+        "1mo",
+    ]:
+        return None
+    return [f"candles:{request.query.get('symbol')}"]
+
+
+# version stamps each read endpoint's response depends on, see conditional.py
+CONDITIONAL_ROUTES = {
+    "/stocks": lambda request: ["fundamentals"],
+    "/search": lambda request: ["fundamentals"],
+    "/screener/{slug}": lambda request: ["fundamentals", "strategies"],
+    # strategies are only written on startup
+    "/meta/screener/{slug}": lambda request: ["strategies"],
+    "/quotes": quotes_depends_on,
+    "/bucket": lambda request: ["buckets"],
+    "/short-interest": lambda request: ["short_interest"],
+}
+
+app = web.Application(
+    client_max_size=1024 * 1000 * 10,
+    middlewares=[latency_middleware, conditional_middleware(CONDITIONAL_ROUTES)],
+)
+app.on_startup.append(connect_events)
+
+if SERVES_API or INGESTS_TICKERS:
+    app.on_startup.append(attach_cache)
+
+if SERVES_API:
+    app.on_startup.append(start_mongo)
+    app.on_startup.append(attach_fmp)
+    app.on_cleanup.append(close_fmp)
+    app.on_cleanup.append(close_investor_deck)
+    app.on_cleanup.append(close_symbol_search)
+    app.on_startup.append(warm_period_candles)
+    if SHARED_TICKERS and "DEV" not in os.environ:
+        app.on_startup.append(follow_shared_tickers)
+
+if INGESTS_TICKERS and "DEV" not in os.environ:
     app.on_startup.append(start_tickermanager)
     app.on_startup.append(schedule_tickermanager_actions)
-app.on_startup.append(init_cron(update_float_shares))
-app.on_startup.append(init_cron(patch_lockup_data))
+    app.on_startup.append(start_scheduler("tickers"))
+    app.on_cleanup.append(save_ticker_state)
+    if "ingester" in ROLES:
+        app.on_startup.append(share_tickers)
+        app.on_cleanup.append(close_ticker_writer)
+
+if RUNS_JOBS:
+    if "DEV" not in os.environ:
+        app.on_startup.append(schedule_cron)
+    app.on_startup.append(start_scheduler("jobs"))
+    app.on_startup.append(init_cron(update_float_shares))
+    app.on_startup.append(init_cron(patch_lockup_data, use_cached=True))
+app.on_cleanup.append(flush_influx_writers)
+app.on_cleanup.append(close_events)
 
 app.add_routes(routes)
 app.add_routes(
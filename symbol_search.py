@@ -0,0 +1,125 @@
+"""Caching proxy in front of Yahoo's symbol search, for /sm.
+
+Yahoo matches queries fuzzily, across more fields than the quotes carry, so
+answering a longer query by substring filtering the result of its prefix is an
+approximation: it can leave out quotes Yahoo would return for the longer query.
+"""
+import asyncio
+import collections
+import time
+
+import aiohttp
+
+SEARCH_URL = "https://query1.finance.yahoo.com/v1/finance/search"
+# quotes Yahoo is asked for per search
+QUOTES_COUNT = 10
+# how long a search result is served from the cache
+SEARCH_TTL = 10 * 60
+# queries kept in the cache, least recently used ones are evicted first
+MAX_QUERIES = 5000
+
+
+def _matches(quote: dict, query: str) -> bool:
+    return any(
+        query in (quote.get(field) or "").lower()
+        for field in ["symbol", "shortname", "longname"]
+    )
+
+
+class SymbolSearch:
+    """Yahoo's symbol search, cached for typeahead.
+
+    Results are cached per query. A query is also answered from the cached result
+    of one of its prefixes, filtered locally, when that result wasn't cut off at
+    QUOTES_COUNT and so has every quote the longer query could match. Identical
+    queries in flight at the same time share one request.
+    """
+
+    def __init__(self, ttl: float = SEARCH_TTL, max_queries: int = MAX_QUERIES):
+        self._ttl = ttl
+        self._max_queries = max_queries
+        # query -> (expires at, response)
+        self._results = collections.OrderedDict()
+        self._searching = {}
+        self._session = None
+        self.hits = 0
+        self.prefix_hits = 0
+        self.misses = 0
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        # created on first use, so it's bound to the loop serving requests
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession()
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _get(self, query: str):
+        cached = self._results.get(query)
+        if cached is None:
+            return None
+        if cached[0] < time.time():
+            del self._results[query]
+            return None
+        self._results.move_to_end(query)
+        return cached[1]
+
+    def _cached(self, query: str):
+        response = self._get(query)
+        if response is not None:
+            self.hits += 1
+            return response
+
+        for end in range(len(query) - 1, 0, -1):
+            response = self._get(query[:end])
+            quotes = response.get("quotes") if response is not None else None
+            if quotes is not None and len(quotes) < QUOTES_COUNT:
+                self.prefix_hits += 1
+                # the prefix's news and other results don't apply to the query
+                quotes = [quote for quote in quotes if _matches(quote, query)]
+                return {"count": len(quotes), "quotes": quotes, "news": []}
+        return None
+
+    async def search(self, q: str) -> dict:
+        query = q.strip().lower()
+        response = self._cached(query)
+        if response is not None:
+            return response
+
+        searching = self._searching.get(query)
+        if searching is None:
+            self.misses += 1
+            searching = self._searching[query] = asyncio.ensure_future(
+                self._search(query)
+            )
+            searching.add_done_callback(lambda _: self._searching.pop(query, None))
+        return await asyncio.shield(searching)
+
+    async def _search(self, query: str) -> dict:
+        async with self.session.get(
+            SEARCH_URL, params={"q": query, "quotesCount": QUOTES_COUNT}
+        ) as response:
+            data = await response.json()
+            if response.status != 200:
+                # passed on, but not cached
+                return data
+
+        self._results[query] = (time.time() + self._ttl, data)
+        self._results.move_to_end(query)
+        while len(self._results) > self._max_queries:
+            self._results.popitem(last=False)
+        return data
+
+    @property
+    def stats(self):
+        return {
+            "queries": len(self._results),
+            "hits": self.hits,
+            "prefix_hits": self.prefix_hits,
+            "misses": self.misses,
+            "in_flight": len(self._searching),
+        }
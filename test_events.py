@@ -0,0 +1,59 @@
+import json
+import unittest
+
+from events import Events
+
+
+class FakeChannel:
+    def __init__(self, messages):
+        self._messages = messages
+
+    async def iter(self, encoding=None):
+        for message in self._messages:
+            yield json.dumps(message)
+
+
+class FakeSubscriber:
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class TestEvents(unittest.IsolatedAsyncioTestCase):
+    async def test_handlers_get_local_and_remote_events(self):
+        events = Events()
+        received = []
+
+        @events.on("fundamentals")
+        async def failing(**data):
+            raise RuntimeError("handler bug")
+
+        @events.on("fundamentals")
+        async def fundamentals_changed(slugs=None, changes=None):
+            received.append((slugs, changes))
+
+        await events.publish("fundamentals", slugs=["four-stars"])
+        self.assertEqual(received, [(["four-stars"], None)])
+
+        subscriber = FakeSubscriber()
+        await events._listen(
+            subscriber,
+            FakeChannel(
+                [
+                    # published by this process, already handled
+                    {
+                        "event": "fundamentals",
+                        "data": {"slugs": None},
+                        "origin": events._origin,
+                    },
+                    {
+                        "event": "fundamentals",
+                        "data": {"changes": {"MSFT": {"market_cap": 1.0}}},
+                        "origin": "worker",
+                    },
+                ]
+            ),
+        )
+        self.assertEqual(received[1:], [(None, {"MSFT": {"market_cap": 1.0}})])
+        self.assertTrue(subscriber.closed)
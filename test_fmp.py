@@ -0,0 +1,30 @@
+import unittest
+
+from FMP import FinancialModelingPrep
+
+
+class TestInterleavedNews(unittest.IsolatedAsyncioTestCase):
+    async def test_news_and_press_releases_merged_newest_first(self):
+        fmp = FinancialModelingPrep("key")
+
+        async def get_news(symbol, limit=50):
+            return [
+                {"title": "c", "publishedDate": "2021-03-03 10:00:00"},
+                {"title": "a", "publishedDate": "2021-03-01 10:00:00"},
+            ]
+
+        async def get_press_releases(symbol, limit=50):
+            # out of order, still merged correctly
+            return [
+                {"title": "b", "date": "2021-03-02 10:00:00", "text": ""},
+                {"title": "d", "date": "2021-03-04 10:00:00", "text": ""},
+            ]
+
+        fmp.get_news = get_news
+        fmp.get_press_releases = get_press_releases
+
+        news = await fmp.get_interleaved_news("AAPL")
+        self.assertEqual([new["title"] for new in news], ["d", "c", "b", "a"])
+        self.assertEqual(news[0]["publishedDate"], "2021-03-04T10:00:00")
+        self.assertTrue(news[0]["isPressRelease"])
+        self.assertFalse(news[1]["isPressRelease"])
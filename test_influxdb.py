@@ -4,6 +4,7 @@ import unittest
 
 import pytest
 import timeseries.db
+import timeseries.writer
 from aioinflux import InfluxDBClient
 
 
@@ -35,6 +36,7 @@ class TestTimeseries(unittest.IsolatedAsyncioTestCase):
             },
         ]
         await timeseries.db.store_candles(points)
+        await timeseries.db.flush_writes()
         earlier = timeseries.db.influx_res_to_dict(
             await timeseries.db.get_candles(
                 timestamp - datetime.timedelta(minutes=100000),
@@ -48,6 +50,7 @@ class TestTimeseries(unittest.IsolatedAsyncioTestCase):
         # overwrite
         points[0]["close"] = 12
         await timeseries.db.store_candles(points)
+        await timeseries.db.flush_writes()
         after = timeseries.db.influx_res_to_dict(
             await timeseries.db.get_candles(
                 timestamp - datetime.timedelta(minutes=100000),
@@ -65,6 +68,7 @@ class TestTimeseries(unittest.IsolatedAsyncioTestCase):
         )
         points.append(point2)
         await timeseries.db.store_candles(points)
+        await timeseries.db.flush_writes()
         final = timeseries.db.influx_res_to_dict(
             await timeseries.db.get_candles(
                 timestamp - datetime.timedelta(minutes=100000),
@@ -76,6 +80,8 @@ class TestTimeseries(unittest.IsolatedAsyncioTestCase):
         self.assertNotEqual(final, points)
 
     async def asyncTearDown(self):
+        await timeseries.writer.close_writers()
+
         # drop database at the end of test
         async with InfluxDBClient(db=self.db_name, host=self.db_host) as client:
             await client.drop_database(db=self.db_name)
@@ -0,0 +1,20 @@
+import datetime
+
+from investor_deck import MAX_PRESENTATIONS_TTL, InvestorDeck
+
+
+def test_presentation_urls_ttl_follows_earliest_expiry():
+    now = datetime.datetime.now().timestamp()
+    urls = [
+        {"url": "a", "expiry": now + 3600},
+        {"url": "b", "expiry": now + 1800},
+    ]
+    ttl = InvestorDeck.presentation_urls_ttl(urls)
+    assert datetime.timedelta(minutes=24) < ttl < datetime.timedelta(minutes=25)
+
+    assert InvestorDeck.presentation_urls_ttl([]) == MAX_PRESENTATIONS_TTL
+    far = [{"url": "c", "expiry": now + 7 * 24 * 3600}]
+    assert InvestorDeck.presentation_urls_ttl(far) == MAX_PRESENTATIONS_TTL
+    # URLs without an expiry are treated as expiring now
+    unsigned = [{"url": "d", "expiry": InvestorDeck._get_expiry_from_aws_url("d")}]
+    assert InvestorDeck.presentation_urls_ttl(unsigned) <= datetime.timedelta(0)
@@ -0,0 +1,190 @@
+import asyncio
+import collections
+import time
+import unittest
+
+from jobs import JobQueue, QueueFull
+from scheduler import ScheduledJob, Scheduler
+
+
+class TestJobQueue(unittest.IsolatedAsyncioTestCase):
+    async def test_same_key_runs_in_order(self):
+        queue = JobQueue()
+        ran = []
+        release = asyncio.Event()
+
+        async def job(name, wait=False):
+            ran.append(f"start {name}")
+            if wait:
+                await release.wait()
+            ran.append(f"end {name}")
+
+        first = queue.submit("first", "screener:1", job, "first", True)
+        second = queue.submit("second", "screener:1", job, "second")
+        other = queue.submit("other", "screener:2", job, "other")
+        await asyncio.sleep(0.01)
+        self.assertEqual(ran, ["start first", "start other", "end other"])
+        self.assertEqual(queue.get(second.id).status, "queued")
+
+        release.set()
+        await asyncio.sleep(0.01)
+        self.assertEqual(ran[3:], ["end first", "start second", "end second"])
+        for submitted in [first, second, other]:
+            self.assertEqual(queue.get(submitted.id).status, "done")
+        self.assertGreaterEqual(first.json()["duration"], 0)
+
+    async def test_failures_recorded_and_depth_bounded(self):
+        queue = JobQueue(max_pending=1)
+
+        async def fail():
+            raise ValueError("bad csv")
+
+        job = queue.submit("fail", "screener:1", fail)
+        with self.assertRaises(QueueFull):
+            queue.submit("fail", "screener:1", fail)
+        await asyncio.sleep(0.01)
+        self.assertEqual(job.status, "failed")
+        self.assertIn("bad csv", job.error)
+        queue.submit("fail", "screener:1", fail)
+
+
+class FakeRedis:
+    def __init__(self):
+        self.lists = collections.defaultdict(asyncio.Queue)
+        self.values = {}
+
+    async def llen(self, key):
+        return self.lists[key].qsize()
+
+    async def rpush(self, key, value):
+        self.lists[key].put_nowait(value)
+
+    async def blpop(self, key, timeout=0):
+        return key, await self.lists[key].get()
+
+    async def set(self, key, value, expire=0):
+        self.values[key] = value
+
+    async def get(self, key, encoding=None):
+        return self.values.get(key)
+
+    def close(self):
+        pass
+
+    async def wait_closed(self):
+        pass
+
+
+class TestSubmittedJobs(unittest.IsolatedAsyncioTestCase):
+    async def test_jobs_run_by_the_consuming_process(self):
+        redis = FakeRedis()
+        api, worker = JobQueue(), JobQueue()
+        api._redis = worker._redis = redis
+        worker._consumer = asyncio.create_task(worker._consume(redis))
+        self.addAsyncCleanup(worker.close)
+        ran = []
+
+        async def upload(csv):
+            ran.append(csv)
+
+        for queue in [api, worker]:
+            queue.task(upload)
+
+        job = await api.enqueue("upload", "screener:1", upload, "a,b")
+        self.assertEqual((await api.status(job.id))["status"], "queued")
+        await asyncio.sleep(0.01)
+        self.assertEqual(ran, ["a,b"])
+        # looked up from the process that took the upload
+        self.assertIsNone(api.get(job.id))
+        self.assertEqual((await api.status(job.id))["status"], "done")
+
+        async def unregistered():
+            pass
+
+        with self.assertRaises(ValueError):
+            await api.enqueue("other", "screener:2", unregistered)
+
+
+class TestScheduler(unittest.IsolatedAsyncioTestCase):
+    async def test_overlapping_runs_skipped_and_heavy_jobs_capped(self):
+        scheduler = Scheduler(max_heavy=1, stagger=0)
+        gapfill = ScheduledJob("gapfill", "0 2 * * *", heavy=True)
+        buckets = ScheduledJob("buckets", "0 4 * * *", heavy=True)
+        running = []
+        release = asyncio.Event()
+
+        async def heavy_job(name):
+            running.append(name)
+            await release.wait()
+            running.remove(name)
+            return {"items": 10, "failed": 1}
+
+        first = asyncio.ensure_future(
+            scheduler.run(gapfill, lambda: heavy_job("gapfill"))
+        )
+        await asyncio.sleep(0)
+        self.assertIsNone(await scheduler.run(gapfill, lambda: heavy_job("gapfill")))
+        self.assertEqual(gapfill.skipped, 1)
+
+        second = asyncio.ensure_future(
+            scheduler.run(buckets, lambda: heavy_job("buckets"))
+        )
+        await asyncio.sleep(0.01)
+        self.assertEqual(running, ["gapfill"])
+
+        release.set()
+        await asyncio.gather(first, second)
+        self.assertEqual(buckets.runs[-1]["status"], "done")
+        self.assertEqual(buckets.runs[-1]["items"], 10)
+        self.assertGreater(buckets.runs[-1]["waited"], 0)
+
+    async def test_heavy_starts_staggered_when_waiting_together(self):
+        scheduler = Scheduler(max_heavy=3, stagger=0.05)
+        started = {}
+
+        async def heavy_job(name):
+            started[name] = time.monotonic()
+
+        await asyncio.gather(
+            *(
+                scheduler.run(
+                    ScheduledJob(name, "0 2 * * *", heavy=True), heavy_job, name
+                )
+                for name in ["gapfill", "buckets", "rebuild"]
+            )
+        )
+        starts = sorted(started.values())
+        for earlier, later in zip(starts, starts[1:]):
+            self.assertGreaterEqual(later - earlier, 0.04)
+
+    async def test_failed_run_recorded(self):
+        scheduler = Scheduler()
+        job = ScheduledJob("lockup", "0 0 * * *", heavy=False)
+
+        async def fail():
+            raise RuntimeError("marketbeat down")
+
+        await scheduler.run(job, fail)
+        self.assertEqual(job.runs[-1]["status"], "failed")
+        self.assertFalse(job.running)
+
+    async def test_crons_start_with_their_group(self):
+        scheduler = Scheduler()
+        self.addCleanup(scheduler.stop)
+
+        async def lockup():
+            return 3
+
+        job = scheduler.cron("0 0 * * *")(lockup)
+        ticker = scheduler.cron("0 10 * * 1-5", name="refresh", group="tickers")(lockup)
+        self.assertIsNone(job.cron)
+
+        scheduler.start("jobs")
+        self.assertIsNotNone(job.cron)
+        self.assertIsNone(ticker.cron)
+        late = scheduler.cron("0 2 * * *", name="late")(lockup)
+        self.assertIsNotNone(late.cron)
+
+        # running right away goes through the scheduler too
+        self.assertEqual(await job.func(), 3)
+        self.assertEqual(job.runs[-1]["items"], 3)
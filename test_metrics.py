@@ -0,0 +1,38 @@
+import unittest
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+import metrics
+from metrics import LatencyHistogram, latency_middleware
+
+
+def test_latency_histogram_quantiles():
+    histogram = LatencyHistogram()
+    for ms in [0.5, 3, 3, 4, 40, 20000]:
+        histogram.observe(ms)
+
+    stats = histogram.json()
+    assert stats["count"] == 6
+    assert stats["buckets"]["le_1"] == 1
+    assert stats["buckets"]["le_5"] == 3
+    assert stats["buckets"]["inf"] == 1
+    assert stats["p50_ms"] == 5
+    assert stats["p99_ms"] is None
+
+
+class TestLatencyMiddleware(unittest.IsolatedAsyncioTestCase):
+    async def test_latency_recorded_per_route(self):
+        async def handler(request):
+            return web.json_response({})
+
+        app = web.Application(middlewares=[latency_middleware])
+        app.router.add_get("/meta/{stock}/{screener}", handler)
+        metrics.latencies.clear()
+
+        async with TestClient(TestServer(app)) as client:
+            for stock in ["AAPL", "MSFT"]:
+                await client.get(f"/meta/{stock}/four-stars")
+
+        stats = metrics.latency_stats()
+        self.assertEqual(stats["GET /meta/{stock}/{screener}"]["count"], 2)
@@ -0,0 +1,139 @@
+import types
+import unittest
+
+from bson import ObjectId, json_util
+
+from db import DB
+from screeners import ScreenerPayloads
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self._docs = iter(docs)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._docs)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class FakeCollection:
+    def __init__(self, docs=()):
+        self.docs = list(docs)
+
+    def _matching(self, query):
+        return [
+            doc
+            for doc in self.docs
+            if all(doc.get(key) == value for key, value in (query or {}).items())
+        ]
+
+    def find(self, query=None, projection=None):
+        return FakeCursor(self._matching(query))
+
+    async def find_one(self, query):
+        matching = self._matching(query)
+        return matching[0] if matching else None
+
+
+class FakeStrategies(FakeCollection):
+    def __init__(self, docs, collections):
+        super().__init__(docs)
+        self._collections = collections
+
+    def __getitem__(self, name):
+        return self._collections.setdefault(name, FakeCollection())
+
+    def __getattr__(self, name):
+        return self[name]
+
+
+class TestScreenerPayloads(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        strategies = FakeStrategies(
+            [
+                {"_id": ObjectId(), "slug": "all-stocks", "name": "All"},
+                {"_id": ObjectId(), "slug": "four-stars", "name": "Four Stars"},
+            ],
+            {
+                "all_stocks": FakeCollection(
+                    {
+                        "symbol": symbol,
+                        "fundamentals": {
+                            "market_cap": cap,
+                            "score_1": 1,
+                            "name": symbol,
+                        },
+                    }
+                    for symbol, cap in [("AAPL", 2000.0), ("MSFT", 1500.0)]
+                ),
+                "four_stars": FakeCollection(
+                    [
+                        {"symbol": "MSFT", "fundamentals": {"score_1": 9}},
+                        {"symbol": "GONE", "fundamentals": {"score_1": 5}},
+                    ]
+                ),
+            },
+        )
+        self.db = DB()
+        self.db.client = {"fpc": types.SimpleNamespace(strategies=strategies)}
+        self.payloads = ScreenerPayloads(self.db)
+
+    async def test_payload_matches_query(self):
+        for slug in ["all-stocks", "four-stars"]:
+            payload = await self.payloads.get(slug)
+            expected = json_util.dumps(await self.db.get_screened_stocks(slug))
+            self.assertEqual(payload.body, expected.encode())
+        self.assertIsNone(await self.payloads.get("not-a-strategy"))
+
+    async def test_patch_reserializes_changed_rows(self):
+        before = await self.payloads.get("four-stars")
+        await self.payloads.patch({"MSFT": {"market_cap": 1800.0, "score_1": 0}})
+
+        stocks = json_util.loads((await self.payloads.get("four-stars")).body)["stocks"]
+        self.assertEqual(stocks[0]["data"]["market_cap"], 1800.0)
+        # the strategy's own score takes precedence
+        self.assertEqual(stocks[0]["data"]["score_1"], 9)
+        self.assertNotEqual((await self.payloads.get("four-stars")).etag, before.etag)
+
+
+class TestStockMeta(unittest.IsolatedAsyncioTestCase):
+    async def test_meta_combines_strategy_and_stock_data(self):
+        strategies = FakeStrategies(
+            [
+                {
+                    "slug": "all-stocks",
+                    "attrs_slug_to_name": {"market_cap": "Market Cap"},
+                },
+                {
+                    "slug": "four-stars",
+                    "attrs_slug_to_name": {"score_1": "Score", "other": "Other"},
+                },
+            ],
+            {
+                "all_stocks": FakeCollection(
+                    [{"symbol": "MSFT", "fundamentals": {"market_cap": 1.0}}]
+                ),
+                "four_stars": FakeCollection(
+                    [{"symbol": "MSFT", "fundamentals": {"score_1": 9, "other": 1}}]
+                ),
+            },
+        )
+        db = DB()
+        db.client = {"fpc": types.SimpleNamespace(strategies=strategies)}
+
+        meta = await db.get_stock_meta_for_strategy("MSFT", "four-stars")
+        self.assertEqual(meta["strategy"]["slug"], "four-stars")
+        self.assertEqual(
+            meta["attrs_slug_to_name"], {"market_cap": "Market Cap", "score_1": "Score"}
+        )
+        self.assertEqual(meta["meta"], {"market_cap": 1.0, "score_1": 9})
+
+        # strategy metas are only looked up once
+        strategies.docs.clear()
+        meta = await db.get_stock_meta_for_strategy("MSFT", "four-stars")
+        self.assertEqual(meta["strategy"]["slug"], "four-stars")
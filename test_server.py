@@ -0,0 +1,136 @@
+import asyncio
+import datetime
+import types
+import unittest
+from unittest import mock
+
+import server
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self._docs = iter(docs)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._docs)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class FakeAllStocks:
+    def __init__(self, docs):
+        self.docs = docs
+        self.writes = []
+
+    def find(self, query, projection=None):
+        symbols = query["symbol"]["$in"]
+        return FakeCursor(doc for doc in self.docs if doc["symbol"] in symbols)
+
+    async def bulk_write(self, requests, ordered=True):
+        self.writes.append(requests)
+
+
+def lockup(symbol, price):
+    return {"symbol": symbol, "current_price": price, "expiration_date": "1/1/2021"}
+
+
+class TestPatchLockupData(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.cache = mock.Mock()
+        self.cache.getJSON = mock.AsyncMock(return_value=[lockup("MSFT", 4.0)])
+        self.cache.setJSON = mock.AsyncMock()
+        self.fetch = mock.AsyncMock(
+            return_value=[lockup("AAPL", 1.0), lockup("MSFT", 3.0), lockup("GONE", 1.0)]
+        )
+        self.all_stocks = FakeAllStocks(
+            [
+                {
+                    "symbol": "AAPL",
+                    "fundamentals": {"ipo_lockup_data": lockup("AAPL", 1.0)},
+                },
+                {
+                    "symbol": "MSFT",
+                    "fundamentals": {"ipo_lockup_data": lockup("MSFT", 2.0)},
+                },
+            ]
+        )
+        self.publish = mock.AsyncMock()
+        fake_db = types.SimpleNamespace(
+            db=types.SimpleNamespace(
+                strategies=types.SimpleNamespace(all_stocks=self.all_stocks)
+            )
+        )
+        for patcher in [
+            mock.patch.object(server, "cache", self.cache),
+            mock.patch.object(server, "get_lockup_data", self.fetch),
+            mock.patch.object(server, "db", fake_db),
+            mock.patch.object(server, "publish_fundamentals", self.publish),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_startup_hook_uses_cached_table(self):
+        started = []
+        with mock.patch.object(
+            server.asyncio,
+            "create_task",
+            lambda coro: started.append(asyncio.ensure_future(coro)),
+        ):
+            await server.init_cron(server.patch_lockup_data, use_cached=True)(None)
+        self.assertEqual(await started[0], 1)
+
+        self.assertEqual(server.patch_lockup_data.runs[-1]["status"], "done")
+        self.fetch.assert_not_called()
+        self.publish.assert_awaited_once_with(
+            changes={"MSFT": {"ipo_lockup_data": lockup("MSFT", 4.0)}}
+        )
+
+    async def test_daily_run_fetches_and_writes_changed_rows(self):
+        self.assertEqual(await server.patch_lockup_data.func(), 1)
+
+        self.fetch.assert_awaited_once()
+        self.cache.getJSON.assert_not_called()
+        self.assertEqual(self.cache.setJSON.await_args[0][1], self.fetch.return_value)
+        # AAPL is unchanged and GONE isn't a stock we list
+        (requests,) = self.all_stocks.writes
+        self.assertEqual(
+            [request._filter for request in requests], [{"symbol": "MSFT"}]
+        )
+        self.publish.assert_awaited_once_with(
+            changes={"MSFT": {"ipo_lockup_data": lockup("MSFT", 3.0)}}
+        )
+
+    async def test_empty_fetch_leaves_stored_data(self):
+        self.fetch.return_value = []
+        self.assertEqual(await server.patch_lockup_data.func(), 0)
+
+        self.cache.setJSON.assert_not_called()
+        self.assertEqual(self.all_stocks.writes, [])
+        self.publish.assert_not_called()
+
+
+class TestPresentationUrls(unittest.IsolatedAsyncioTestCase):
+    async def test_cached_only_for_a_whole_second_or_more(self):
+        cache = mock.Mock()
+        cache.getJSON = mock.AsyncMock(return_value=None)
+        cache.setJSON = mock.AsyncMock()
+        api = mock.Mock()
+        api.get_company_presentation_urls = mock.AsyncMock(return_value=[{"url": "u"}])
+
+        with mock.patch.object(server, "investorDeckApi", api):
+            for ttl in [0.5, 1, 60]:
+                api.presentation_urls_ttl.return_value = datetime.timedelta(seconds=ttl)
+                urls = await server.get_cached_presentation_urls(cache, "AAPL")
+                self.assertEqual(urls, [{"url": "u"}])
+
+        self.assertEqual(
+            [
+                call.kwargs["expiry"].total_seconds()
+                for call in cache.setJSON.await_args_list
+            ],
+            [1, 60],
+        )
@@ -0,0 +1,77 @@
+import asyncio
+import unittest
+
+from symbol_search import SymbolSearch
+
+
+class FakeResponse:
+    status = 200
+
+    def __init__(self, data):
+        self._data = data
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    async def json(self):
+        await asyncio.sleep(0.01)
+        return self._data
+
+
+class FakeSession:
+    closed = False
+
+    def __init__(self, quotes):
+        self._quotes = quotes
+        self.queries = []
+
+    def get(self, url, params):
+        self.queries.append(params["q"])
+        matching = [
+            quote
+            for quote in self._quotes
+            if params["q"] in (quote["symbol"] + " " + quote["shortname"]).lower()
+        ]
+        return FakeResponse(
+            {
+                "count": len(matching),
+                "quotes": matching[: params["quotesCount"]],
+                "news": [{"title": f"news about {params['q']}"}],
+            }
+        )
+
+
+class TestSymbolSearch(unittest.IsolatedAsyncioTestCase):
+    async def test_prefixes_reuse_complete_results(self):
+        session = FakeSession(
+            [
+                {"symbol": "AAPL", "shortname": "Apple Inc."},
+                {"symbol": "APPN", "shortname": "Appian Corporation"},
+                {"symbol": "APA", "shortname": "APA Corporation"},
+            ]
+            + [{"symbol": f"A{i}", "shortname": "Filler"} for i in range(20)]
+        )
+        search = SymbolSearch()
+        search._session = session
+
+        # identical queries in flight share a request
+        first, second = await asyncio.gather(search.search("ap"), search.search("AP "))
+        self.assertIs(first, second)
+        self.assertEqual(session.queries, ["ap"])
+
+        # "ap" got all three matches, "app" is filtered from them
+        result = await search.search("app")
+        self.assertEqual(
+            [quote["symbol"] for quote in result["quotes"]], ["AAPL", "APPN"]
+        )
+        self.assertEqual((result["count"], result["news"]), (2, []))
+        self.assertEqual(session.queries, ["ap"])
+
+        # "a" was cut off at QUOTES_COUNT, so "ab" isn't answered from it
+        await search.search("a")
+        await search.search("ab")
+        self.assertEqual(session.queries, ["ap", "a", "ab"])
+        self.assertEqual(search.stats["prefix_hits"], 1)
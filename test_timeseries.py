@@ -1,8 +1,40 @@
+import asyncio
+import base64
 import datetime
+import gzip
+import json
+import unittest
+from unittest import mock
+
+import aiohttp
+import pandas
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer, make_mocked_request
+from aioinflux.serialization.mapping import serialize
 
 import timeseries.cron
+import timeseries.dashboard
+import timeseries.stream
+import timeseries.yahoo_finance
+from timeseries.bars import BarBuilder
+from timeseries.candle_cache import CandleCache
+from conditional import conditional_middleware
+from payloads import payload_response
+from versions import versions
 from timeseries.cron import calibrate_timestamp
-from timeseries.yahoo_finance import Interval
+from timeseries.decoder import (
+    decode_frames,
+    decode_pricing_data,
+    decode_pricing_data_protobuf,
+)
+from timeseries.fanout import QuoteFanout
+from timeseries.periods import PeriodCandles
+from timeseries.PricingData_pb2 import PricingData
+from timeseries.stream import QuoteStream
+from timeseries.shared_tickers import SharedTickerReader, SharedTickerWriter
+from timeseries.today import MarketClock, TickerManager, TickerTable
+from timeseries.writer import InfluxWriter, encode_dataframe, encode_point
+from timeseries.yahoo_finance import FloatSharesScanner, Interval, YahooFinance
 
 
 def test_calibrate_timestamp():
@@ -27,3 +59,615 @@ def test_calibrate_timestamp():
     assert calibrate_timestamp(weekday, Interval.ONE_DAY) == one_day_out
     assert calibrate_timestamp(weekday, Interval.ONE_WEEK) == one_week_out
     assert calibrate_timestamp(weekday, Interval.ONE_MONTH) == one_month_out
+
+
+class TestHistoricalDataChunked(unittest.IsolatedAsyncioTestCase):
+    async def test_chunks_reassembled_in_order_without_duplicates(self):
+        yf = YahooFinance()
+        frm = datetime.datetime(2020, 1, 1)
+        to = datetime.datetime(2020, 1, 22)
+        calls = []
+
+        async def fake_request(symbol, start, end, interval, session=None):
+            calls.append(start)
+            # earlier chunks answer last, so ordering has to be restored
+            await asyncio.sleep((to - start).days / 1000)
+            timestamps = list(
+                range(yf._get_epoch_time(start), yf._get_epoch_time(end) + 1, 86400)
+            )
+            return {
+                "chart": {
+                    "result": [
+                        {
+                            "timestamp": timestamps,
+                            "indicators": {
+                                "quote": [
+                                    {
+                                        "open": [float(ts) for ts in timestamps],
+                                        "high": [float(ts) for ts in timestamps],
+                                        "low": [float(ts) for ts in timestamps],
+                                        "close": [float(ts) for ts in timestamps],
+                                        "volume": [1] * len(timestamps),
+                                    }
+                                ]
+                            },
+                        }
+                    ]
+                }
+            }
+
+        yf._data_request = fake_request
+        res = await yf.get_historical_data("AAPL", frm, to, Interval.ONE_MINUTE)
+
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(res["timestamps"], sorted(set(res["timestamps"])))
+        self.assertEqual(len(res["timestamps"]), 22)
+        self.assertEqual(res["open"], [float(ts) for ts in res["timestamps"]])
+        self.assertEqual(len(res["volume"]), 22)
+
+    async def test_failed_chunk_is_retried(self):
+        yf = YahooFinance()
+        attempts = []
+
+        async def flaky_request(symbol, start, end, interval, session=None):
+            attempts.append(start)
+            if len(attempts) == 1:
+                raise aiohttp.ClientError("boom")
+            return {"chart": {"result": None, "error": {"description": "x"}}}
+
+        yf._data_request = flaky_request
+        with mock.patch.object(timeseries.yahoo_finance, "CHUNK_RETRY_BACKOFF", 0):
+            chunks = [
+                chunk
+                async for chunk in yf.get_historical_data_chunked(
+                    "AAPL",
+                    datetime.datetime(2020, 1, 1),
+                    datetime.datetime(2020, 1, 2),
+                    Interval.ONE_DAY,
+                )
+            ]
+        self.assertEqual(len(chunks), 1)
+        self.assertEqual(len(attempts), 2)
+
+
+def test_encode_point_matches_aioinflux():
+    point = {
+        "time": datetime.datetime(2020, 7, 22, 16, 0, 0),
+        "measurement": "short_interest",
+        "tags": {"symbol": "BRK B"},
+        "fields": {
+            "name": 'Berkshire "B", Inc',
+            "short_interest": 12,
+            "price": 210.5,
+            "market_cap": None,
+        },
+    }
+    expected = serialize(point).decode()
+    assert (
+        encode_point(
+            point["measurement"], point["tags"], point["fields"], point["time"]
+        )
+        == expected
+    )
+
+
+def test_encode_dataframe_skips_nan_fields():
+    df = pandas.DataFrame(
+        {
+            "open": [1.0, float("nan")],
+            "close": [2.0, 3.0],
+            "bucket": ["rnd", "rnd"],
+            "interval": ["1d", "1d"],
+        },
+        index=pandas.DatetimeIndex(["2020-07-22", "2020-07-23"]),
+    )
+    assert encode_dataframe(df, "agg_ohlcv", tag_columns=["bucket", "interval"]) == [
+        "agg_ohlcv,bucket=rnd,interval=1d open=1.0,close=2.0 1595376000000000000",
+        "agg_ohlcv,bucket=rnd,interval=1d close=3.0 1595462400000000000",
+    ]
+
+
+class TestInfluxWriter(unittest.IsolatedAsyncioTestCase):
+    async def test_written_waits_for_regular_batches(self):
+        payloads = []
+        client = mock.Mock()
+        client.write = mock.AsyncMock(side_effect=payloads.append)
+        writer = InfluxWriter("db", "host", batch_size=2, flush_interval=60)
+        writer._get_client = mock.AsyncMock(return_value=client)
+        self.addAsyncCleanup(writer.close)
+
+        await writer.write(["a"])
+        first = writer.written()
+        await asyncio.sleep(0)
+        # a partial batch isn't flushed early
+        self.assertFalse(first.done())
+
+        await writer.write(["b", "c"])
+        second = writer.written()
+        await asyncio.wait_for(first, 1)
+        self.assertEqual(payloads, ["a\nb"])
+        self.assertFalse(second.done())
+
+        await writer.flush()
+        self.assertTrue(second.done())
+        self.assertTrue(writer.written().done())
+
+
+def test_bar_builder_rolls_up_minute_bars():
+    builder = BarBuilder()
+    # 2020-07-22 13:30:00 UTC, 9:30 in New York
+    open_ts = 1595424600
+    day_volume = 1000
+    for minute in range(6):
+        for second, price in [(1, 10.0 + minute), (30, 12.0 + minute)]:
+            day_volume += 100
+            builder.on_tick("AAPL", price, day_volume, open_ts + minute * 60 + second)
+
+    bars = builder.drain()
+    # the sixth minute is still in progress, and with it the first 5m bar
+    assert [bar[1] for bar in bars] == [Interval.ONE_MINUTE] * 5
+    assert [bar[2] for bar in bars] == [open_ts + i * 60 for i in range(5)]
+    assert bars[1][3:] == (11.0, 13.0, 11.0, 13.0, 200)
+    # the very first tick has nothing to diff its day volume against
+    assert bars[0][-1] == 100
+
+    builder.sweep(open_ts + 60 * 60 * 2)
+    swept = builder.drain()
+    assert [(bar[1], bar[2]) for bar in swept] == [
+        (Interval.ONE_MINUTE, open_ts + 5 * 60),
+        (Interval.FIVE_MINUTE, open_ts),
+        (Interval.FIVE_MINUTE, open_ts + 5 * 60),
+        (Interval.FIFTEEN_MINUTE, open_ts),
+        (Interval.ONE_HOUR, open_ts),
+    ]
+    assert swept[1][3:] == (10.0, 16.0, 10.0, 16.0, 900)
+    assert swept[3][3:] == (10.0, 17.0, 10.0, 17.0, 1100)
+    assert builder.drain() == []
+
+
+def test_float_shares_scanner_across_chunks():
+    stores = {
+        "OtherStore": {"floatShares": {"raw": 1}},
+        "QuoteSummaryStore": {
+            "defaultKeyStatistics": {
+                "floatShares": {"raw": 16309000000, "fmt": "16.31B"},
+                "sharesOutstanding": {"raw": 16319399936},
+            }
+        },
+    }
+    page = (
+        "<html><script>root.App.main = "
+        + json.dumps({"context": {"dispatcher": {"stores": stores}}})
+        + ";</script>"
+        + "x" * 10000
+    ).encode()
+
+    for size in [1, 7, len(page)]:
+        scanner = FloatSharesScanner()
+        for i in range(0, len(page), size):
+            scanner.feed(page[i : i + size])
+            if scanner.done:
+                break
+        scanner.finish()
+        assert scanner.value == {"raw": 16309000000, "fmt": "16.31B"}
+        assert i < 1000
+
+    scanner = FloatSharesScanner()
+    scanner.feed(b'"QuoteSummaryStore": {"defaultKeyStatistics": {}}')
+    scanner.finish()
+    assert scanner.value is None
+
+
+def test_ticker_table_snapshot_json_matches_rows():
+    table = TickerTable(["AAPL", "BRK.B", "NVDA"])
+    slot = table.slot("BRK.B")
+    table.open[slot] = 200.5
+    table.close[slot] = 201.25
+    table.high[slot] = 202.0
+    table.low[slot] = 199.0
+    table.volume[slot] = 123456
+    table.last_updated_at[slot] = 1595424601.5
+
+    assert table.row(slot) == {
+        "symbol": "BRK.B",
+        "open": 200.5,
+        "close": 201.25,
+        "high": 202.0,
+        "low": 199.0,
+        "volume": 123456,
+        "last_updated_at": 1595424601.5,
+    }
+    assert json.loads(table.snapshot_json()) == table.snapshot()
+    assert table.snapshot()[0]["open"] is None
+
+    table.clear(slot)
+    assert table.row(slot)["close"] is None
+
+
+def test_shared_ticker_table_mirrors_writer(tmp_path):
+    path = str(tmp_path / "tickers")
+    writer = SharedTickerWriter(path)
+    writer.open()
+    reader = SharedTickerReader(path)
+    try:
+        table = TickerTable(["AAPL", "MSFT"])
+        table.close[0] = 150.0
+        writer.publish(table)
+        assert reader.read() == ["AAPL"]
+        assert reader.table.row(0)["close"] == 150.0
+        assert reader.read() == []
+
+        table.close[1] = 300.0
+        writer.publish(table)
+        assert reader.read() == ["MSFT"]
+
+        # new symbols are picked up with their rows
+        moved = TickerTable(["MSFT", "NVDA"])
+        moved.copy_from(table)
+        writer.publish(moved)
+        assert reader.read() == ["MSFT"]
+        assert reader.table.symbols == ["MSFT", "NVDA"]
+        assert json.loads(reader.table.snapshot_json()) == moved.snapshot()
+    finally:
+        reader.close()
+        writer.close()
+
+
+class TestTickerManagerBootstrap(unittest.IsolatedAsyncioTestCase):
+    async def test_incremental_bootstrap_skips_fresh_symbols(self):
+        symbols = [f"SYM{i}" for i in range(250)]
+        manager = TickerManager()
+        manager.set_symbols(symbols)
+        requested = []
+
+        async def get_today_quotes(batch, session=None):
+            requested.append(list(batch))
+            if "SYM200" in batch:
+                raise aiohttp.ClientError("boom")
+            return {
+                symbol: {"open": 1, "high": 2, "low": 0.5, "close": 1.5, "volume": 10}
+                for symbol in batch
+            }
+
+        manager._yf.get_today_quotes = get_today_quotes
+
+        stats = await manager.bootstrap(skip_fresh=False)
+        self.assertEqual(sorted(len(batch) for batch in requested), [50, 100, 100])
+        self.assertEqual(stats["failed_requests"], 1)
+        self.assertEqual(stats["failed_symbols"], 50)
+        self.assertEqual(manager.get_ohlcv("SYM0")["close"], 1.5)
+        self.assertIsNone(manager.get_ohlcv("SYM249")["close"])
+
+        # only the batch that failed is requested again
+        requested.clear()
+        stats = await manager.bootstrap()
+        self.assertEqual(requested, [symbols[200:]])
+        self.assertEqual(stats["skipped_fresh"], 200)
+
+
+def test_ticker_state_restored_within_session():
+    manager = TickerManager()
+    manager.set_symbols(["AAPL", "MSFT"])
+    slot = manager._table.slot("MSFT")
+    manager._table.high[slot] = 301.5
+    manager._table.volume[slot] = 1000
+    manager._table.refreshed_at[slot] = 1595424601.0
+    state = manager.dump_state()
+
+    restarted = TickerManager()
+    restarted.set_symbols(["MSFT", "NVDA"])
+    assert restarted.restore_state(state)
+    assert restarted.get_ohlcv("MSFT")["high"] == 301.5
+    assert restarted.get_ohlcv("MSFT")["volume"] == 1000
+    assert restarted._table.refreshed_at[restarted._table.slot("MSFT")] == 1595424601.0
+    assert restarted.get_ohlcv("NVDA")["high"] is None
+
+    assert not restarted.restore_state(TickerTable(["MSFT"]).dumps("2020-07-21"))
+
+
+def test_period_candles_merge_live_day():
+    candles = PeriodCandles()
+    # Thursday 2020-07-30 to Monday 2020-08-03, as stored by update_data
+    for day, ohlcv in [
+        (30, (10.0, 12.0, 9.0, 11.0, 100)),
+        (31, (11.0, 15.0, 10.0, 14.0, 200)),
+    ]:
+        candles.add("AAPL", datetime.datetime(2020, 7, day), *ohlcv)
+    live = {
+        "timestamp": 1,
+        "open": 15.5,
+        "high": 17.0,
+        "low": 8.0,
+        "close": 16.5,
+        "volume": 50,
+    }
+
+    week = candles.get("1wk", "AAPL", live, today=datetime.date(2020, 7, 31))
+    assert (week["open"], week["high"], week["low"], week["close"]) == (
+        10.0,
+        17.0,
+        8.0,
+        16.5,
+    )
+    assert week["volume"] == 150
+    # stamped with the first trading day stored for the week
+    assert week["timestamp"] == int(
+        datetime.datetime(2020, 7, 30, 16).timestamp() * 10 ** 9
+    )
+
+    # a new day rolls over, days before the week and month are dropped
+    candles.add("AAPL", 1596412800 * 10 ** 9, 14.0, 16.0, 13.0, 15.0, 300)
+    assert list(candles._days["AAPL"]) == [datetime.date(2020, 8, 3)]
+
+    # new week and month, the live candle is the period candle
+    assert candles.get("1mo", "AAPL", live, today=datetime.date(2020, 8, 3)) == live
+
+    # no live prices, today's stored candle is used instead
+    empty = dict(live, open=None, close=None)
+    month = candles.get("1mo", "AAPL", empty, today=datetime.date(2020, 8, 3))
+    assert (month["open"], month["close"], month["volume"]) == (14.0, 15.0, 300)
+
+
+class TestCandleCache(unittest.IsolatedAsyncioTestCase):
+    async def test_ranges_sliced_from_cached_superset(self):
+        day = 24 * 60 * 60 * 10 ** 9
+        rows = [[i * day, 1.0, 2.0, 0.5, 1.5, 100, "1d", "AAPL"] for i in range(30)]
+        queried = []
+
+        async def query(start, end):
+            queried.append((start, end))
+            values = [row for row in rows if start <= row[0] <= end]
+            return {"name": "ohlcv", "columns": [], "values": values} if values else []
+
+        cache = CandleCache()
+        first = await cache.get(query, "db", "AAPL", "1d", 5 * day, 10 * day)
+        self.assertEqual(
+            [row[0] for row in first["values"]], [5 * day + i * day for i in range(6)]
+        )
+        inside = await cache.get(query, "db", "AAPL", "1d", 6 * day + 1, 8 * day)
+        self.assertEqual([row[0] for row in inside["values"]], [7 * day, 8 * day])
+        self.assertEqual(len(queried), 1)
+
+        # a wider range grows the cached one
+        await cache.get(query, "db", "AAPL", "1d", 2 * day, 7 * day)
+        self.assertEqual(queried[-1], (2 * day, 11 * day - 1))
+        await cache.get(query, "db", "AAPL", "1d", 3 * day, 10 * day)
+        self.assertEqual(len(queried), 2)
+
+        # writes bypass and then invalidate the symbol
+        written = asyncio.Event()
+        cache.begin_write(["AAPL"])
+        ending = asyncio.ensure_future(cache.end_write_after(["AAPL"], written.wait()))
+        await cache.get(query, "db", "AAPL", "1d", 3 * day, 4 * day)
+        self.assertEqual(len(queried), 3)
+        written.set()
+        await ending
+        self.assertNotIn("AAPL", cache._writing)
+        await cache.get(query, "db", "AAPL", "1d", 3 * day, 4 * day)
+        await cache.get(query, "db", "AAPL", "1d", 3 * day, 4 * day)
+        self.assertEqual(len(queried), 4)
+        self.assertEqual(
+            await cache.get(query, "db", "AAPL", "1d", 40 * day, 41 * day), []
+        )
+
+    async def test_evicts_least_recently_used(self):
+        queried = []
+
+        async def query(start, end):
+            queried.append(start)
+            return {"values": [[start, 1.0, 2.0, 0.5, 1.5, 100, "1d", "X"]] * 10}
+
+        cache = CandleCache()
+        await cache.get(query, "db", "AAPL", "1d", 0, 1)
+        cache = CandleCache(max_bytes=cache.stats["bytes"] * 2)
+        for symbol in ["AAPL", "MSFT", "AAPL", "NVDA", "AAPL", "MSFT"]:
+            await cache.get(query, "db", symbol, "1d", 0, 1)
+        # AAPL stayed cached, MSFT was evicted for NVDA
+        self.assertEqual(len(queried), 5)
+        self.assertEqual(cache.stats["entries"], 2)
+        self.assertEqual(set(cache._keys), {"AAPL", "MSFT"})
+
+
+class TestDashboardPayloads(unittest.IsolatedAsyncioTestCase):
+    async def test_served_from_payload_until_rebuilt(self):
+        builds = []
+
+        async def build_dashboard(start, end):
+            builds.append((start, end))
+            return {"name": "agg_ohlcv", "values": [[len(builds)]], "spy": []}
+
+        patcher = mock.patch.object(
+            timeseries.dashboard, "build_dashboard", build_dashboard
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        payloads = timeseries.dashboard.DashboardPayloads()
+        start, end = datetime.datetime(2020, 1, 1), datetime.datetime(2021, 1, 1)
+        first, second = await asyncio.gather(
+            payloads.get(start, end), payloads.get(start, end)
+        )
+        self.assertIs(first, second)
+        self.assertEqual(len(builds), 1)
+
+        response = payload_response(
+            make_mocked_request(
+                "GET", "/dashboard", headers={"Accept-Encoding": "gzip"}
+            ),
+            first,
+        )
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(json.loads(gzip.decompress(response.body))["values"], [[1]])
+
+        response = payload_response(
+            make_mocked_request(
+                "GET", "/dashboard", headers={"If-None-Match": first.etag}
+            ),
+            await payloads.get(start, end),
+        )
+        self.assertEqual(response.status, 304)
+
+        await payloads.rebuild()
+        rebuilt = await payloads.get(start, end)
+        self.assertEqual(len(builds), 2)
+        self.assertNotEqual(rebuilt.etag, first.etag)
+
+
+class TestConditionalMiddleware(unittest.IsolatedAsyncioTestCase):
+    async def test_not_modified_without_running_handler(self):
+        calls = []
+
+        async def handler(request):
+            calls.append(request.path)
+            return web.json_response({"calls": len(calls)})
+
+        app = web.Application(
+            middlewares=[
+                conditional_middleware({"/bucket": lambda request: ["test-buckets"]})
+            ]
+        )
+        app.router.add_get("/bucket", handler)
+        app.router.add_get("/other", handler)
+        client = TestClient(TestServer(app))
+        await client.start_server()
+        self.addAsyncCleanup(client.close)
+
+        first = await client.get("/bucket")
+        etag = first.headers["ETag"]
+        self.assertEqual(first.headers["Cache-Control"], "public, no-cache")
+        cached = await client.get("/bucket", headers={"If-None-Match": etag})
+        self.assertEqual(cached.status, 304)
+        since = await client.get(
+            "/bucket", headers={"If-Modified-Since": first.headers["Last-Modified"]}
+        )
+        self.assertEqual(since.status, 304)
+        self.assertEqual(len(calls), 1)
+
+        # bumped stamps show once the event handlers apply them
+        await versions.bump("test-buckets")
+        unchanged = await client.get("/bucket", headers={"If-None-Match": etag})
+        self.assertEqual(unchanged.status, 304)
+        versions.apply(await versions.fetch("test-buckets"))
+        changed = await client.get("/bucket", headers={"If-None-Match": etag})
+        self.assertEqual(changed.status, 200)
+        self.assertNotEqual(changed.headers["ETag"], etag)
+
+        other = await client.get("/other")
+        self.assertNotIn("ETag", other.headers)
+        self.assertEqual(len(calls), 3)
+
+
+def test_market_clock_rolls_over_days():
+    clock = MarketClock()
+    day = datetime.datetime(2020, 7, 22)
+
+    def at(day, hour, minute):
+        return day.replace(hour=hour, minute=minute).timestamp()
+
+    assert not clock.is_open(at(day, 9, 29))
+    assert clock.is_open(at(day, 9, 31))
+    assert clock.is_open(at(day, 15, 59))
+    assert not clock.is_open(at(day, 16, 1))
+
+    next_day = day + datetime.timedelta(days=1)
+    assert clock.is_open(at(next_day, 10, 0))
+    assert not clock.is_open(at(next_day, 20, 0))
+
+
+class TestQuoteStream(unittest.IsolatedAsyncioTestCase):
+    async def test_symbols_packed_into_few_connections(self):
+        started = []
+        stream = QuoteStream(on_quotes=None, max_symbols=3)
+        # no sockets in tests, only the packing is checked
+        patcher = mock.patch.object(
+            timeseries.stream._Connection,
+            "start",
+            lambda conn: started.append(conn.index),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        await stream.set_symbols(["A", "B", "C", "D"])
+        self.assertEqual(
+            [conn.symbols for conn in stream._connections], [{"A", "B", "C"}, {"D"}]
+        )
+
+        await stream.set_symbols(["A", "D", "E", "F"])
+        self.assertEqual(
+            [conn.symbols for conn in stream._connections], [{"A", "E", "F"}, {"D"}]
+        )
+        self.assertEqual(started, [0, 1])
+
+        await stream.set_symbols(["E"])
+        self.assertEqual([conn.symbols for conn in stream._connections], [{"E"}])
+
+    async def test_bad_frame_dropped_from_batch(self):
+        received = []
+        stream = QuoteStream(on_quotes=received.append)
+        conn = timeseries.stream._Connection(stream, 0)
+        pd = PricingData()
+        pd.id = "AAPL"
+        pd.time = 1595424601123
+        frame = base64.b64encode(pd.SerializeToString())
+
+        with self.assertLogs("timeseries.stream", "ERROR"):
+            conn._pending = [frame, b"x", frame]
+            conn._drain()
+        self.assertEqual(
+            [[quote[0] for quote in quotes] for quotes in received], [["AAPL", "AAPL"]]
+        )
+
+
+def test_hand_written_decoder_matches_protobuf():
+    pd = PricingData()
+    pd.id = "BRK-B"
+    pd.price = 210.37
+    pd.time = 1595424601123
+    pd.currency = "USD"
+    pd.quoteType = PricingData.EQUITY
+    pd.marketHours = PricingData.POST_MARKET
+    pd.changePercent = -1.25
+    pd.dayVolume = 123456789
+    pd.change = -2.5
+    pd.priceHint = 2
+    pd.circulatingSupply = 1.5
+    frame = base64.b64encode(pd.SerializeToString())
+
+    assert decode_pricing_data(base64.b64decode(frame)) == (
+        decode_pricing_data_protobuf(base64.b64decode(frame))
+    )
+    assert decode_frames([frame, frame])[1] == (
+        "BRK-B",
+        pd.price,
+        1595424601123,
+        PricingData.POST_MARKET,
+        123456789,
+    )
+
+
+class TestQuoteFanout(unittest.IsolatedAsyncioTestCase):
+    async def test_updates_coalesced_and_serialized_once(self):
+        renders = []
+
+        def render(symbol):
+            renders.append(symbol)
+            return {"symbol": symbol, "close": len(renders)}
+
+        fanout = QuoteFanout(render)
+        first = fanout.subscribe(["AAPL", "MSFT"])
+        second = fanout.subscribe(["AAPL"])
+
+        for _ in range(10):
+            fanout.mark("AAPL")
+        fanout.mark("NVDA")
+        fanout.publish()
+
+        self.assertEqual(renders, ["AAPL"])
+        self.assertEqual(first.queue.qsize(), 1)
+        self.assertIs(first.queue.get_nowait(), second.queue.get_nowait())
+
+        fanout.unsubscribe(second)
+        fanout.unsubscribe(first)
+        fanout.mark("AAPL")
+        fanout.publish()
+        self.assertEqual(renders, ["AAPL"])
@@ -0,0 +1,26 @@
+import unittest
+
+from versions import Versions
+
+
+class TestVersions(unittest.IsolatedAsyncioTestCase):
+    async def test_bumps_show_once_applied(self):
+        versions = Versions()
+        etag, _ = versions.stamp(["fundamentals"])
+
+        await versions.bump("fundamentals")
+        self.assertEqual(versions.stamp(["fundamentals"])[0], etag)
+        versions.apply(await versions.fetch("fundamentals"))
+        self.assertNotEqual(versions.stamp(["fundamentals"])[0], etag)
+
+    async def test_digest_stamps_follow_content(self):
+        versions = Versions()
+        await versions.set_digest("strategies", "a")
+        etag, last_modified = versions.stamp(["strategies"])
+
+        await versions.set_digest("strategies", "a")
+        self.assertEqual(versions.stamp(["strategies"]), (etag, last_modified))
+        await versions.set_digest("strategies", "b")
+        changed, modified = versions.stamp(["strategies"])
+        self.assertNotEqual(changed, etag)
+        self.assertGreaterEqual(modified, last_modified)
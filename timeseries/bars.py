@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import time
+
+import numpy as np
+
+from .writer import encode_point
+from .yahoo_finance import Interval
+
+logger = logging.getLogger(__name__)
+
+# (interval, width in seconds, alignment offset in seconds). Hourly bars start on
+# the half hour like Yahoo's, so the first one of the day opens at 9:30.
+BASE_INTERVAL = (Interval.ONE_MINUTE, 60, 0)
+ROLLUP_INTERVALS = [
+    (Interval.FIVE_MINUTE, 5 * 60, 0),
+    (Interval.FIFTEEN_MINUTE, 15 * 60, 0),
+    (Interval.ONE_HOUR, 60 * 60, 30 * 60),
+]
+# how long after a bar's end we still wait for late ticks before closing it
+CLOSE_GRACE = 5
+PERSIST_INTERVAL = 1.0
+
+
+class _BarTable:
+    """Bars in progress for one interval, one slot per symbol."""
+
+    def __init__(self, interval: Interval, width: int, offset: int = 0):
+        self.interval = interval
+        self.width = width
+        self.offset = offset
+
+        # start == 0 means no bar in progress for the slot
+        self.start = np.zeros(0, dtype=np.int64)
+        self.open = np.zeros(0)
+        self.high = np.zeros(0)
+        self.low = np.zeros(0)
+        self.close = np.zeros(0)
+        self.volume = np.zeros(0, dtype=np.int64)
+
+    def grow(self, size: int):
+        extra = size - len(self.start)
+        if extra <= 0:
+            return
+        for name in ["start", "open", "high", "low", "close", "volume"]:
+            array = getattr(self, name)
+            setattr(
+                self, name, np.concatenate([array, np.zeros(extra, dtype=array.dtype)])
+            )
+
+    def align(self, ts: int) -> int:
+        return ts - (ts - self.offset) % self.width
+
+    def take(self, slot: int):
+        """Removes the bar in progress for `slot` and returns it."""
+        bar = (
+            int(self.start[slot]),
+            float(self.open[slot]),
+            float(self.high[slot]),
+            float(self.low[slot]),
+            float(self.close[slot]),
+            int(self.volume[slot]),
+        )
+        self.start[slot] = 0
+        return bar
+
+    def add(self, slot: int, start: int, open, high, low, close, volume):
+        """Merges OHLCV for the bar starting at `start` into the slot.
+
+        Returns the previous bar if this one replaced it, else None.
+        """
+        current = self.start[slot]
+        if current == start:
+            if high > self.high[slot]:
+                self.high[slot] = high
+            if low < self.low[slot]:
+                self.low[slot] = low
+            self.close[slot] = close
+            self.volume[slot] += volume
+            return None
+
+        if start < current:
+            # late data for a bar we already closed
+            return None
+
+        completed = self.take(slot) if current else None
+        self.start[slot] = start
+        self.open[slot] = open
+        self.high[slot] = high
+        self.low[slot] = low
+        self.close[slot] = close
+        self.volume[slot] = volume
+        return completed
+
+    def expired(self, now: float):
+        return np.flatnonzero(
+            (self.start != 0) & (self.start + self.width + CLOSE_GRACE <= now)
+        )
+
+
+class BarBuilder:
+    """Builds 1m bars from streamed ticks and rolls them up to longer intervals.
+
+    Completed bars accumulate until `drain` is called.
+    """
+
+    def __init__(self, base=BASE_INTERVAL, rollups=ROLLUP_INTERVALS):
+        self._slots = {}
+        self._symbols = []
+        self._day_volume = np.zeros(0, dtype=np.int64)
+        self._base = _BarTable(*base)
+        self._rollups = [_BarTable(*rollup) for rollup in rollups]
+        self._completed = []
+
+    def _slot(self, symbol: str) -> int:
+        slot = self._slots.get(symbol)
+        if slot is None:
+            slot = self._slots[symbol] = len(self._symbols)
+            self._symbols.append(symbol)
+            if slot >= len(self._day_volume):
+                size = max(64, 2 * len(self._day_volume))
+                self._day_volume = np.concatenate(
+                    [self._day_volume, np.zeros(size - len(self._day_volume), np.int64)]
+                )
+                for table in [self._base, *self._rollups]:
+                    table.grow(size)
+        return slot
+
+    def on_tick(self, symbol: str, price: float, day_volume: int, timestamp: float):
+        slot = self._slot(symbol)
+
+        # the stream only carries the running day volume, a bar gets the difference
+        previous_volume = self._day_volume[slot]
+        volume = day_volume - previous_volume if previous_volume else 0
+        if volume < 0:
+            volume = 0
+        self._day_volume[slot] = day_volume
+
+        start = self._base.align(int(timestamp))
+        completed = self._base.add(slot, start, price, price, price, price, volume)
+        if completed is not None:
+            self._complete(slot, completed)
+
+    def _complete(self, slot: int, bar):
+        self._completed.append((self._symbols[slot], self._base.interval, *bar))
+        start, open, high, low, close, volume = bar
+        for table in self._rollups:
+            rolled = table.add(slot, table.align(start), open, high, low, close, volume)
+            if rolled is not None:
+                self._completed.append((self._symbols[slot], table.interval, *rolled))
+
+    def sweep(self, now: float = None):
+        """Closes bars whose interval has ended, even if no tick followed them."""
+        now = time.time() if now is None else now
+        for slot in self._base.expired(now).tolist():
+            self._complete(slot, self._base.take(slot))
+        for table in self._rollups:
+            for slot in table.expired(now).tolist():
+                self._completed.append(
+                    (self._symbols[slot], table.interval, *table.take(slot))
+                )
+
+    def drain(self):
+        completed, self._completed = self._completed, []
+        return completed
+
+    def clear(self):
+        self._day_volume[:] = 0
+        for table in [self._base, *self._rollups]:
+            table.start[:] = 0
+
+
+def bar_to_line(bar) -> str:
+    symbol, interval, start, open, high, low, close, volume = bar
+    return encode_point(
+        "ohlcv",
+        {"symbol": symbol.replace("-", "."), "interval": interval.value},
+        {"open": open, "high": high, "low": low, "close": close, "volume": volume},
+        start * 10 ** 9,
+    )
+
+
+async def persist_bars(builder: BarBuilder, writer_factory, interval=PERSIST_INTERVAL):
+    """Periodically closes finished bars and queues them for writing."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            builder.sweep()
+            bars = builder.drain()
+            if bars:
+                await writer_factory().write([bar_to_line(bar) for bar in bars])
+        except Exception:
+            logger.exception("persisting streamed bars failed")
@@ -7,9 +7,12 @@ import pandas as pd
 from strategies import STRATEGIES
 
 from db import DB
+from events import events
+from versions import versions
 
 from .db import (
     delete_past_bucket_data,
+    flush_writes,
     get_latest_bucket_record,
     get_stocklist_candles,
     store_bucket_candles,
@@ -129,6 +132,12 @@ async def update_buckets(app, startover=False):
                 print("Bucket: ", bucketname, interval, "up to date")
                 pass
 
+    # bucket candles are written behind, make sure they are queryable first
+    await flush_writes()
+    print("Bucket: rebuilding dashboards at", datetime.datetime.now())
+    await versions.bump("buckets")
+    await events.publish("buckets")
+
 
 async def get_data_to_aggregate(bucketname, stocklist, interval, startover):
 
@@ -0,0 +1,149 @@
+import bisect
+import collections
+import sys
+
+# only these change exclusively through store_candles; intraday bars are written
+# continuously from the stream
+CACHED_INTERVALS = ["1d", "1wk", "1mo"]
+MAX_BYTES = 128 * 2 ** 20
+
+_DAY_NS = 24 * 60 * 60 * 10 ** 9
+
+
+class _Entry:
+    __slots__ = ("start", "end", "series", "times", "nbytes")
+
+    def __init__(self, start: int, end: int, series):
+        self.start = start
+        self.end = end
+        self.series = series
+        values = series["values"] if series else []
+        self.times = [row[0] for row in values]
+        self.nbytes = _estimate_bytes(values)
+
+    def slice(self, start: int, end: int):
+        lo = bisect.bisect_left(self.times, start)
+        hi = bisect.bisect_right(self.times, end)
+        if lo == hi:
+            return []
+        return dict(self.series, values=self.series["values"][lo:hi])
+
+
+def _estimate_bytes(values) -> int:
+    if not values:
+        return 0
+    row = values[0]
+    return len(values) * (sys.getsizeof(row) + sum(sys.getsizeof(v) for v in row))
+
+
+class CandleCache:
+    """LRU cache of candle query results, bounded by their approximate size.
+
+    Each (db, symbol, interval) keeps one result for a day aligned range, grown to
+    cover every range requested so far; requests inside it are sliced out without
+    querying. Symbols are invalidated while their candles are being written, so a
+    result is never cached from before a write landed.
+    """
+
+    def __init__(self, max_bytes: int = MAX_BYTES):
+        self._max_bytes = max_bytes
+        self._entries = collections.OrderedDict()
+        self._keys = collections.defaultdict(set)
+        self._bytes = 0
+        # bumped on every write, so results of queries racing a write are dropped
+        self._generations = collections.Counter()
+        self._writing = collections.Counter()
+        self._hits = 0
+        self._misses = 0
+
+    async def get(self, query, db: str, symbol: str, interval: str, start, end):
+        """Candles for `start` to `end` in ns, with `query(start, end)` on a miss."""
+        if interval not in CACHED_INTERVALS or self._writing[symbol]:
+            return await query(start, end)
+
+        key = (db, symbol, interval)
+        entry = self._entries.get(key)
+        if entry is not None and entry.start <= start and end <= entry.end:
+            self._hits += 1
+            self._entries.move_to_end(key)
+            return entry.slice(start, end)
+
+        self._misses += 1
+        aligned_start = start - start % _DAY_NS
+        aligned_end = end - end % _DAY_NS + _DAY_NS - 1
+        if entry is not None:
+            aligned_start = min(aligned_start, entry.start)
+            aligned_end = max(aligned_end, entry.end)
+
+        generation = self._generations[symbol]
+        series = await query(aligned_start, aligned_end)
+        entry = _Entry(aligned_start, aligned_end, series)
+        if generation == self._generations[symbol] and not self._writing[symbol]:
+            self._put(key, entry)
+        return entry.slice(start, end)
+
+    def _put(self, key, entry: _Entry):
+        self._drop(key)
+        self._entries[key] = entry
+        self._keys[key[1]].add(key)
+        self._bytes += entry.nbytes
+        while self._bytes > self._max_bytes and self._entries:
+            self._drop(next(iter(self._entries)))
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.nbytes
+            keys = self._keys.get(key[1])
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys[key[1]]
+
+    def invalidate(self, symbols):
+        for symbol in symbols:
+            self._generations[symbol] += 1
+            for key in list(self._keys.pop(symbol, ())):
+                self._drop(key)
+
+    def generation(self, symbol: str) -> int:
+        """Changes whenever candles of `symbol` are written."""
+        return self._generations[symbol]
+
+    def begin_write(self, symbols):
+        """Bypasses the cache for `symbols` until `end_write`."""
+        self.invalidate(symbols)
+        self._writing.update(symbols)
+
+    def end_write(self, symbols):
+        self._writing.subtract(symbols)
+        for symbol in symbols:
+            if self._writing[symbol] <= 0:
+                del self._writing[symbol]
+        self.invalidate(symbols)
+
+    async def end_write_after(self, symbols, written):
+        """Ends the write once the `written` awaitable is done."""
+        try:
+            await written
+        finally:
+            self.end_write(symbols)
+
+    def clear(self):
+        self._entries.clear()
+        self._keys.clear()
+        self._bytes = 0
+
+    @property
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self._max_bytes,
+            "hits": self._hits,
+            "misses": self._misses,
+            "writing": sum(1 for count in self._writing.values() if count > 0),
+        }
+
+
+candle_cache = CandleCache()
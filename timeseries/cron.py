@@ -3,8 +3,7 @@ import datetime
 import time
 from typing import List
 
-import aiocron
-
+from scheduler import scheduler
 
 from .db import get_latest_timestamp, store_candles
 from .yahoo_finance import Interval, YahooFinance
@@ -142,6 +141,7 @@ async def update_data_chunked(interval, stocks, chunk=60):
     await asyncio.wait(tasks)
     end_time = time.time()
     print(f"data update finished for {interval} in {end_time - start_time} seconds")
+    return len(stocks)
 
 
 def update_data_factory(interval, stocks):
@@ -176,7 +176,9 @@ async def create_crontabs(client):
 
         # await update_data_chunked(duration, stocks)
         # update cron
-        aiocron.crontab(cron_map[duration])(update_data_factory(duration, stocks))
+        scheduler.cron(
+            cron_map[duration], name=f"update_data {duration.value}", heavy=True
+        )(update_data_factory(duration, stocks))
 
     # One off update of buckets each restart
     # print("-------- Restart Bucket Update beginning at ", datetime.datetime.today())
@@ -0,0 +1,90 @@
+import asyncio
+import collections
+import datetime
+
+from events import events
+from payloads import Payload
+from versions import versions
+
+from .candle_cache import candle_cache
+from .db import get_all_bucket_candles, get_candles
+
+# date ranges of the most recently requested dashboards are kept materialized
+MAX_RANGES = 10
+
+
+async def build_dashboard(start: datetime.datetime, end: datetime.datetime):
+    bucket_candles = await get_all_bucket_candles(start, end)
+
+    spy = await get_candles(start=start, end=end, symbol="SPY", interval="1d")
+
+    bucket_candles["spy"] = spy
+    return bucket_candles
+
+
+class DashboardPayloads:
+    """Serialized /dashboard responses for the most recently requested ranges.
+
+    Buckets only change when they are re-aggregated, which publishes a "buckets"
+    event that calls `rebuild`, once the bucket candles are flushed. The SPY
+    candles are written separately, so a payload is also rebuilt when they were
+    written since it was built.
+    """
+
+    def __init__(self, max_ranges: int = MAX_RANGES):
+        self._max_ranges = max_ranges
+        # (start, end) -> (payload, SPY candle generation)
+        self._payloads = collections.OrderedDict()
+        self._building = {}
+        # bumped by rebuilds, so builds that started before one don't get stored
+        self._version = 0
+
+    async def get(self, start: datetime.datetime, end: datetime.datetime) -> Payload:
+        key = (start, end)
+        cached = self._payloads.get(key)
+        if cached is not None and cached[1] == candle_cache.generation("SPY"):
+            self._payloads.move_to_end(key)
+            return cached[0]
+        return await self._build(key)
+
+    async def _build(self, key) -> Payload:
+        # concurrent requests for the same range share one build
+        building = self._building.get(key)
+        if building is None:
+            building = self._building[key] = asyncio.ensure_future(
+                self._build_payload(key)
+            )
+            building.add_done_callback(lambda _: self._building.pop(key, None))
+        return await asyncio.shield(building)
+
+    async def _build_payload(self, key) -> Payload:
+        version = self._version
+        generation = candle_cache.generation("SPY")
+        payload = Payload.from_data(await build_dashboard(*key))
+        if version != self._version:
+            return payload
+        self._payloads[key] = (payload, generation)
+        self._payloads.move_to_end(key)
+        while len(self._payloads) > self._max_ranges:
+            self._payloads.popitem(last=False)
+        return payload
+
+    async def rebuild(self):
+        """Rebuilds the payloads of all materialized ranges."""
+        self._version += 1
+        for key in list(self._payloads):
+            try:
+                await self._build_payload(key)
+            except Exception as ex:
+                print("rebuilding dashboard failed for", key, ex)
+                self._payloads.pop(key, None)
+
+
+dashboard_payloads = DashboardPayloads()
+
+
+@events.on("buckets")
+async def _buckets_updated():
+    stamps = await versions.fetch("buckets")
+    await dashboard_payloads.rebuild()
+    versions.apply(stamps)
@@ -1,3 +1,4 @@
+import asyncio
 import datetime
 import os
 import typing
@@ -6,6 +7,19 @@ from pytz import timezone
 
 from aioinflux import InfluxDBClient
 
+from events import events
+from versions import versions
+
+from .candle_cache import candle_cache
+from .periods import first_day, period_candles, row_date
+from .writer import (
+    encode_dataframe,
+    encode_point,
+    encode_timestamp,
+    flush_writers,
+    get_writer,
+)
+
 import linecache
 import sys
 
@@ -64,103 +78,132 @@ class ShortInterestPoint(typing.TypedDict):
     industry: str
 
 
+def _ohlcv_line(point):
+    return encode_point(
+        "ohlcv",
+        {"symbol": point["symbol"], "interval": point["interval"]},
+        {
+            "open": point["open"],
+            "high": point["high"],
+            "low": point["low"],
+            "close": point["close"],
+            "volume": point["volume"],
+        },
+        point["timestamp"],
+    )
+
+
 async def store_candles(points: typing.Iterable[OHLCVPoint]):
-    async with InfluxDBClient(db=DB_NAME, host=DB_HOST) as client:
-        await client.create_database(db=DB_NAME)
+    lines = []
+    symbols = set()
+    # daily candles of the current periods, for period_candles of every process
+    daily = []
+    start = first_day(datetime.date.today()) - datetime.timedelta(days=1)
+    for point in points:
+        symbols.add(point["symbol"])
+        lines.append(_ohlcv_line(point))
+        if point["interval"] == "1d":
+            ns = encode_timestamp(point["timestamp"])
+            if row_date(ns) >= start:
+                daily.append(
+                    [point["symbol"], ns]
+                    + [
+                        None if point[key] is None else float(point[key])
+                        for key in ["open", "high", "low", "close", "volume"]
+                    ]
+                )
 
-        points = [
-            {
-                "time": point["timestamp"],
-                "measurement": "ohlcv",
-                "tags": {
-                    "symbol": point["symbol"],
-                    "interval": point["interval"],
-                },
-                "fields": {
-                    "open": point["open"],
-                    "high": point["high"],
-                    "low": point["low"],
-                    "close": point["close"],
-                    "volume": point["volume"],
-                },
-            }
-            for point in points
-        ]
-
-        await client.write(points)
+    # cached candles of these symbols are stale until the points are in Influx
+    writer = get_writer(DB_NAME, DB_HOST)
+    candle_cache.begin_write(symbols)
+    try:
+        await writer.write([line for line in lines if line is not None])
+    finally:
+        asyncio.ensure_future(
+            candle_cache.end_write_after(
+                symbols,
+                _publish_when_written(
+                    writer.written(),
+                    [f"candles:{symbol}" for symbol in symbols],
+                    "candles",
+                    symbols=sorted(symbols),
+                    daily=daily,
+                ),
+            )
+        )
 
 
-async def store_candles_gapFill(points: typing.Iterable[OHLCVPoint_gapfill]):
-    async with InfluxDBClient(db=DB_NAME, host=DB_HOST) as client:
-        await client.create_database(db=DB_NAME)
+async def _publish_when_written(written, names, event, **data):
+    # the points go out with the writer's next regular batch
+    await written
+    await versions.bump(*names)
+    await events.publish(event, **data)
 
-        points = [
-            {
-                "time": point["timestamp"],
-                "measurement": "ohlcv",
-                "tags": {
-                    "symbol": point["symbol"],
-                    "interval": point["interval"],
-                },
-                "fields": {
-                    "open": point["open"],
-                    "high": point["high"],
-                    "low": point["low"],
-                    "close": point["close"],
-                    "volume": point["volume"],
-                },
-            }
-            for point in points
-        ]
-
-        await client.write(points)
 
+@events.on("candles")
+async def _candles_written(symbols, daily):
+    stamps = await versions.fetch(*(f"candles:{symbol}" for symbol in symbols))
+    candle_cache.invalidate(symbols)
+    for row in daily:
+        period_candles.add(*row)
+    versions.apply(stamps)
 
-async def store_bucket_candles(dataframe):
-    async with InfluxDBClient(db="fpc_buckets", host=DB_HOST) as client:
-        await client.create_database(db="fpc_buckets")
 
-        await client.write(
-            dataframe, measurement="agg_ohlcv", tag_columns=["bucket", "interval"]
-        )
+@events.on("short_interest")
+async def _short_interest_written():
+    versions.apply(await versions.fetch("short_interest"))
+
+
+async def store_candles_gapFill(points: typing.Iterable[OHLCVPoint_gapfill]):
+    await store_candles(points)
+
+
+async def store_bucket_candles(dataframe):
+    await get_writer("fpc_buckets", DB_HOST).write(
+        encode_dataframe(dataframe, "agg_ohlcv", tag_columns=["bucket", "interval"])
+    )
 
 
 async def store_short_interest(points: typing.Iterable[ShortInterestPoint]):
-    async with InfluxDBClient(db=DB_NAME, host=DB_HOST) as client:
-        await client.create_database(db=DB_NAME)
-        points = [
+    lines = [
+        encode_point(
+            "short_interest",
+            {"symbol": point["symbol"]},
             {
-                "time": point["timestamp"],
-                "measurement": "short_interest",
-                "tags": {
-                    "symbol": point["symbol"],
-                },
-                "fields": {
-                    "name": point["fundamentals"]["name"],
-                    "short_interest": point["fundamentals"]["short_interest"] or None,
-                    "days_to_cover_short": point["fundamentals"]["days_to_cover_short"]
-                    or None,
-                    "float_short": point["fundamentals"]["float_short"] or None,
-                    "insider_ownership": point["fundamentals"]["insider_ownership"]
-                    or None,
-                    "institutional_investors_ownership_percent": point["fundamentals"][
-                        "institutional_investors_ownership_percent"
-                    ]
-                    or None,
-                    "average_daily_volume_30d": point["fundamentals"][
-                        "average_daily_volume_30d"
-                    ]
-                    or None,
-                    "price": point["fundamentals"]["price"] or None,
-                    "market_cap": point["fundamentals"]["market_cap"] or None,
-                    "sector": point["fundamentals"]["sector"],
-                    "industry": point["fundamentals"]["industry"],
-                },
-            }
-            for point in points
-        ]
+                "name": point["fundamentals"]["name"],
+                "short_interest": point["fundamentals"]["short_interest"] or None,
+                "days_to_cover_short": point["fundamentals"]["days_to_cover_short"]
+                or None,
+                "float_short": point["fundamentals"]["float_short"] or None,
+                "insider_ownership": point["fundamentals"]["insider_ownership"] or None,
+                "institutional_investors_ownership_percent": point["fundamentals"][
+                    "institutional_investors_ownership_percent"
+                ]
+                or None,
+                "average_daily_volume_30d": point["fundamentals"][
+                    "average_daily_volume_30d"
+                ]
+                or None,
+                "price": point["fundamentals"]["price"] or None,
+                "market_cap": point["fundamentals"]["market_cap"] or None,
+                "sector": point["fundamentals"]["sector"],
+                "industry": point["fundamentals"]["industry"],
+            },
+            point["timestamp"],
+        )
+        for point in points
+    ]
+    writer = get_writer(DB_NAME, DB_HOST)
+    await writer.write([line for line in lines if line is not None])
+    # returned for callers that exit once done, e.g. scripts/init_short_interest.py
+    return asyncio.ensure_future(
+        _publish_when_written(writer.written(), ["short_interest"], "short_interest")
+    )
+
 
-        await client.write(points)
+async def flush_writes():
+    """Waits until all queued points have been written to Influx."""
+    await flush_writers()
 
 
 # Handle mutliple dbs, default to DB_NAME
@@ -182,14 +225,36 @@ async def get_candles(
     symbol: str,
     db: str = None,
 ):
+    db = db or DB_NAME
+
+    async def query(start: int, end: int):
+        return await select_query(
+            "SELECT open, high, low, close, volume, interval, symbol FROM ohlcv WHERE"
+            f" interval='{interval}' AND symbol='{symbol}' AND time <= {end} AND"
+            f" time >= {start}",
+            db=db,
+        )
+
     start = int(start.timestamp() * (10 ** 9))
     end = int(end.timestamp() * (10 ** 9))
-    return await select_query(
-        "SELECT open, high, low, close, volume, interval, symbol FROM ohlcv WHERE"
-        f" interval='{interval}' AND symbol='{symbol}' AND time <= {end} AND time >="
-        f" {start}",
-        db=db or DB_NAME,
+    return await candle_cache.get(query, db, symbol, interval, start, end)
+
+
+async def load_period_candles():
+    """Loads the daily candles of the current week and month into period_candles."""
+    # start a day early, daily candles are stored at midnight UTC and rows outside
+    # the periods are ignored anyway
+    start = int(
+        datetime.datetime.combine(
+            first_day(datetime.date.today()) - datetime.timedelta(days=1),
+            datetime.time(),
+        ).timestamp()
+    )
+    res = await select_query(
+        "SELECT open, high, low, close, volume, symbol FROM ohlcv WHERE"
+        f" interval='1d' AND time >= {start * 10 ** 9}"
     )
+    period_candles.load(res)
 
 
 async def get_period_OHLV(interval: str, symbol: str):
@@ -0,0 +1,93 @@
+import asyncio
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# per symbol, at most this many updates a second are pushed
+MAX_UPDATES_PER_SECOND = 2
+# a subscriber this many messages behind is disconnected
+MAX_QUEUED = 1000
+
+
+class Subscriber:
+    __slots__ = ("symbols", "queue", "overflowed")
+
+    def __init__(self, symbols):
+        self.symbols = set(symbols)
+        self.queue = asyncio.Queue(MAX_QUEUED)
+        self.overflowed = False
+
+
+def sse_event(event: str, data: dict) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+class QuoteFanout:
+    """Pushes coalesced live quote updates to subscribers.
+
+    Ticks only mark a symbol as changed. Every 1 / `max_rate` seconds each changed
+    symbol with subscribers is rendered and serialized once, and the same bytes are
+    queued for all of its subscribers.
+    """
+
+    def __init__(self, render, max_rate: float = MAX_UPDATES_PER_SECOND):
+        self._render = render
+        self._interval = 1 / max_rate
+        self._subscribers = {}
+        self._dirty = set()
+
+    def mark(self, symbol: str):
+        if symbol in self._subscribers:
+            self._dirty.add(symbol)
+
+    def subscribe(self, symbols) -> Subscriber:
+        subscriber = Subscriber(symbols)
+        for symbol in subscriber.symbols:
+            self._subscribers.setdefault(symbol, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        for symbol in subscriber.symbols:
+            subscribers = self._subscribers.get(symbol)
+            if subscribers is None:
+                continue
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._subscribers[symbol]
+                self._dirty.discard(symbol)
+
+    def render(self, symbol: str) -> bytes:
+        try:
+            return sse_event("quote", self._render(symbol))
+        except KeyError:
+            return None
+
+    def publish(self):
+        dirty, self._dirty = self._dirty, set()
+        for symbol in dirty:
+            payload = self.render(symbol)
+            if payload is None:
+                continue
+            for subscriber in self._subscribers.get(symbol, ()):
+                try:
+                    subscriber.queue.put_nowait(payload)
+                except asyncio.QueueFull:
+                    subscriber.overflowed = True
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self._interval)
+            try:
+                self.publish()
+            except Exception:
+                logger.exception("publishing live quotes failed")
+
+    @property
+    def stats(self):
+        return {
+            "symbols": len(self._subscribers),
+            "subscribers": len(
+                {sub for subs in self._subscribers.values() for sub in subs}
+            ),
+        }
@@ -0,0 +1,157 @@
+import datetime
+
+from .writer import encode_timestamp
+
+INTERVALS = ["1wk", "1mo"]
+
+_NS = 10 ** 9
+_DAY = 24 * 60 * 60
+
+
+def row_date(ns: int) -> datetime.date:
+    # daily candles are stored at midnight of their date as UTC, give or take the
+    # DST hour, so round to the nearest day
+    return datetime.datetime.utcfromtimestamp(round(ns / _NS / _DAY) * _DAY).date()
+
+
+def period_start(interval: str, day: datetime.date) -> datetime.date:
+    if interval == "1wk":
+        return day - datetime.timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def first_day(day: datetime.date) -> datetime.date:
+    """The earliest day in any of the periods containing `day`."""
+    return min(period_start(interval, day) for interval in INTERVALS)
+
+
+def _candle(timestamp, open, high, low, close, volume):
+    return {
+        "timestamp": timestamp,
+        "open": open,
+        "high": high,
+        "low": low,
+        "close": close,
+        "volume": volume,
+    }
+
+
+class PeriodCandles:
+    """Week and month to date OHLCV for all symbols, kept in memory.
+
+    Holds the daily candles of the current week and month as they are written.
+    The aggregate of the days before today is cached per symbol, so a period
+    candle is one lookup merged with the live day candle.
+    """
+
+    def __init__(self):
+        # symbol -> {date: (open, high, low, close, volume)}
+        self._days = {}
+        # (interval, symbol) -> (first day, aggregate of the days before today), or None
+        self._aggregates = {}
+        self._today = None
+        self.ready = False
+
+    def add(self, symbol: str, timestamp, open, high, low, close, volume):
+        day = row_date(encode_timestamp(timestamp))
+        # a newer day rolls the periods over, so old days are pruned even in
+        # processes that only ever write
+        if self._today is None or day > self._today:
+            self._roll(day)
+        elif day < first_day(self._today):
+            return
+        self._days.setdefault(symbol, {})[day] = (open, high, low, close, volume)
+        for interval in INTERVALS:
+            self._aggregates.pop((interval, symbol), None)
+
+    def load(self, res):
+        """Adds the rows of a daily candle query with columns time, OHLCV, symbol."""
+        for ns, open, high, low, close, volume, symbol in res["values"] if res else []:
+            self.add(symbol, ns, open, high, low, close, volume)
+        self.ready = True
+
+    def _roll(self, today: datetime.date):
+        if today == self._today:
+            return
+        self._today = today
+        self._aggregates.clear()
+        start = first_day(today)
+        for days in self._days.values():
+            for day in [day for day in days if day < start]:
+                del days[day]
+
+    def _aggregate(self, interval: str, symbol: str):
+        key = (interval, symbol)
+        if key not in self._aggregates:
+            start = period_start(interval, self._today)
+            days = self._days.get(symbol, {})
+            period = [day for day in sorted(days) if start <= day < self._today]
+            rows = [days[day] for day in period]
+            self._aggregates[key] = (
+                (
+                    period[0],
+                    (
+                        rows[0][0],
+                        max(row[1] for row in rows),
+                        min(row[2] for row in rows),
+                        rows[-1][3],
+                        sum(row[4] or 0 for row in rows),
+                    ),
+                )
+                if rows
+                else None
+            )
+        return self._aggregates[key]
+
+    def get(
+        self,
+        interval: str,
+        symbol: str,
+        day_candle: dict,
+        today: datetime.date = None,
+    ) -> dict:
+        """The period to date candle, with today taken from `day_candle`.
+
+        Falls back to today's stored daily candle when the live one has no
+        prices, and to `day_candle` itself on the first trading day of a period.
+        """
+        today = today or datetime.date.today()
+        self._roll(today)
+        aggregate = self._aggregate(interval, symbol)
+
+        if day_candle["open"] and day_candle["close"]:
+            live = (
+                day_candle["open"],
+                day_candle["high"],
+                day_candle["low"],
+                day_candle["close"],
+                day_candle["volume"],
+            )
+        else:
+            live = self._days.get(symbol, {}).get(today)
+
+        if aggregate is None:
+            return (
+                day_candle if live is None else _candle(day_candle["timestamp"], *live)
+            )
+
+        # the first trading day stored for the period at 4pm, which is what the
+        # charts expect
+        first, aggregate = aggregate
+        start = datetime.datetime.combine(first, datetime.time(16))
+        timestamp = int(start.timestamp()) * _NS
+        if live is None:
+            return _candle(timestamp, *aggregate)
+
+        open, high, low, _, volume = aggregate
+        return _candle(
+            timestamp,
+            open,
+            max(high, live[1] or high),
+            min(low, live[2] or low),
+            live[3],
+            volume + (live[4] or 0),
+        )
+
+
+period_candles = PeriodCandles()
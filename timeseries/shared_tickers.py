@@ -0,0 +1,155 @@
+import json
+import mmap
+import os
+import tempfile
+
+import numpy as np
+
+from .today import FIELDS, TickerTable
+
+# a file in shared memory, mapped by the writer and the readers
+SEGMENT_PATH = os.path.join(
+    "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "fpc_tickers"
+)
+# rows the segment has room for, a few times the listed US stocks
+MAX_SYMBOLS = 32768
+# room for the JSON encoded symbol list
+SYMBOLS_BYTES = MAX_SYMBOLS * 16
+
+# the serialized columns, plus when rows were refreshed from Yahoo
+COLUMNS = [*FIELDS, "refreshed_at"]
+
+# header: sequence number, layout version, symbol count, symbol list length
+_HEADER = 4
+_HEADER_BYTES = _HEADER * 8
+_DATA_OFFSET = _HEADER_BYTES + SYMBOLS_BYTES
+_SIZE = _DATA_OFFSET + len(COLUMNS) * MAX_SYMBOLS * 8
+
+
+def _views(buf):
+    header = np.ndarray(_HEADER, dtype=np.int64, buffer=buf)
+    symbols = memoryview(buf)[_HEADER_BYTES:_DATA_OFFSET]
+    data = np.ndarray(
+        (len(COLUMNS), MAX_SYMBOLS), dtype=np.float64, buffer=buf, offset=_DATA_OFFSET
+    )
+    return header, symbols, data
+
+
+class SharedTickerWriter:
+    """Publishes a TickerTable to a shared memory segment, for other processes.
+
+    Writes are guarded by a sequence number, odd while a write is in progress, so
+    readers can tell a torn copy from a consistent one without any locking. The
+    segment outlives the writer, so readers carry on across its restarts.
+    """
+
+    def __init__(self, path: str = SEGMENT_PATH):
+        self._path = path
+        self._map = None
+        self._published = None
+
+    def open(self):
+        fd = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            os.ftruncate(fd, _SIZE)
+            self._map = mmap.mmap(fd, _SIZE)
+        finally:
+            os.close(fd)
+        self._header, self._symbols, self._data = _views(self._map)
+        # a previous writer may have died mid-write
+        if self._header[0] % 2:
+            self._header[0] += 1
+
+    def publish(self, table: TickerTable):
+        count = len(table.symbols)
+        if count > MAX_SYMBOLS:
+            raise ValueError(f"{count} symbols don't fit the shared ticker table")
+
+        header = self._header
+        header[0] += 1
+        try:
+            if table is not self._published:
+                symbols = json.dumps(table.symbols).encode()
+                if len(symbols) > SYMBOLS_BYTES:
+                    raise ValueError("symbols don't fit the shared ticker table")
+                self._symbols[: len(symbols)] = symbols
+                header[1] += 1
+                header[2] = count
+                header[3] = len(symbols)
+                self._published = table
+            for i, field in enumerate(COLUMNS):
+                self._data[i, :count] = getattr(table, field)
+        finally:
+            header[0] += 1
+
+    def close(self):
+        if self._map is not None:
+            del self._header, self._symbols, self._data
+            self._map.close()
+            self._map = None
+
+
+class SharedTickerReader:
+    """Mirrors the TickerTable a SharedTickerWriter publishes."""
+
+    def __init__(self, path: str = SEGMENT_PATH):
+        self._path = path
+        self._map = None
+        self._seq = None
+        self._layout = None
+        self._values = None
+        self.table = None
+
+    def _attach(self):
+        with open(self._path, "rb") as f:
+            if os.fstat(f.fileno()).st_size < _SIZE:
+                # created, but not sized yet
+                raise FileNotFoundError(self._path)
+            self._map = mmap.mmap(f.fileno(), _SIZE, access=mmap.ACCESS_READ)
+        self._header, self._symbols, self._data = _views(self._map)
+
+    def read(self):
+        """Copies the latest published state into `table`.
+
+        Returns the symbols whose rows changed, None when the segment doesn't exist
+        yet or a write was in progress.
+        """
+        if self._map is None:
+            try:
+                self._attach()
+            except FileNotFoundError:
+                return None
+
+        header = self._header
+        seq = int(header[0])
+        if seq == self._seq:
+            return []
+        if seq % 2:
+            return None
+
+        layout, count, length = (int(value) for value in header[1:])
+        symbols = None
+        if layout != self._layout:
+            symbols = json.loads(bytes(self._symbols[:length]))
+        values = np.array(self._data[:, :count])
+        if int(header[0]) != seq:
+            # written to while copying, try again next time
+            return None
+
+        self._seq = seq
+        if symbols is not None:
+            self._layout = layout
+            self.table = TickerTable(symbols)
+            self._values = np.full_like(values, np.nan)
+
+        previous, self._values = self._values, values
+        same = (previous == values) | (np.isnan(previous) & np.isnan(values))
+        for i, field in enumerate(COLUMNS):
+            setattr(self.table, field, values[i])
+        return [self.table.symbols[slot] for slot in np.flatnonzero(~same.all(axis=0))]
+
+    def close(self):
+        if self._map is not None:
+            del self._header, self._symbols, self._data
+            self._map.close()
+            self._map = None
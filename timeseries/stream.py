@@ -0,0 +1,207 @@
+import asyncio
+import collections
+import logging
+import os
+import random
+import time
+
+import aiohttp
+
+from .decoder import decode_frame
+
+logger = logging.getLogger(__name__)
+
+STREAM_URL = "wss://streamer.finance.yahoo.com/"
+# symbols packed into one socket before opening another; Yahoo doesn't document
+# a per-connection limit and silently drops subscriptions past it, so this stays
+# at the 60 known to work unless set otherwise
+MAX_SYMBOLS_PER_CONNECTION = int(os.environ.get("STREAM_SYMBOLS_PER_CONNECTION") or 60)
+RECONNECT_BACKOFF = 1.0
+MAX_RECONNECT_BACKOFF = 60.0
+# window over which messages/sec is reported
+RATE_WINDOW = 60.0
+
+
+class _Connection:
+    """One websocket carrying the quotes for a subset of the symbols."""
+
+    def __init__(self, stream: "QuoteStream", index: int):
+        self._stream = stream
+        self.index = index
+        self.symbols = set()
+        self._ws = None
+        self._task = None
+        self._pending = []
+        self._drain_scheduled = False
+
+        self._messages = 0
+        self._reconnects = 0
+        self._recent = collections.deque()
+        self._last_message_at = None
+        self._lag = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _send(self, message):
+        # if we are between connections, the next connect subscribes everything
+        if self._ws is None or self._ws.closed:
+            return
+        try:
+            await self._ws.send_json(message)
+        except (aiohttp.ClientError, ConnectionError) as ex:
+            logger.warning("quote stream connection %s send failed: %s", self.index, ex)
+
+    async def subscribe(self, symbols):
+        self.symbols.update(symbols)
+        await self._send({"subscribe": sorted(symbols)})
+
+    async def unsubscribe(self, symbols):
+        self.symbols.difference_update(symbols)
+        await self._send({"unsubscribe": sorted(symbols)})
+
+    async def _run(self):
+        failures = 0
+        while True:
+            try:
+                async with aiohttp.ClientSession() as session:
+                    async with session.ws_connect(
+                        self._stream.url, heartbeat=300
+                    ) as ws:
+                        self._ws = ws
+                        await ws.send_json({"subscribe": sorted(self.symbols)})
+                        async for msg in ws:
+                            failures = 0
+                            self._on_frame(msg.data)
+            except asyncio.CancelledError:
+                raise
+            except Exception as ex:
+                logger.warning("quote stream connection %s failed: %s", self.index, ex)
+            finally:
+                self._ws = None
+
+            # back off exponentially while the upstream keeps failing, with
+            # jitter so the connections don't all reconnect at once
+            delay = min(MAX_RECONNECT_BACKOFF, RECONNECT_BACKOFF * 2 ** failures)
+            failures += 1
+            self._reconnects += 1
+            await asyncio.sleep(delay * (0.5 + random.random() / 2))
+
+    def _on_frame(self, data):
+        # frames already buffered on the socket are read without yielding to the
+        # loop, so by the time the drain runs they have all been collected
+        self._pending.append(data)
+        if not self._drain_scheduled:
+            self._drain_scheduled = True
+            asyncio.get_event_loop().call_soon(self._drain)
+
+    def _drain(self):
+        self._drain_scheduled = False
+        frames, self._pending = self._pending, []
+        quotes = []
+        for frame in frames:
+            # a bad frame is dropped on its own, the rest of the batch still counts
+            try:
+                quotes.append(decode_frame(frame))
+            except Exception:
+                logger.exception("decoding quote frame %r failed", frame[:100])
+        if not quotes:
+            return
+
+        now = time.time()
+        self._messages += len(quotes)
+        self._recent.append((now, len(quotes)))
+        self._last_message_at = now
+        if quotes[-1][2]:
+            self._lag = now - quotes[-1][2] / 1000
+
+        try:
+            self._stream.on_quotes(quotes)
+        except Exception:
+            logger.exception("handling %s quotes failed", len(quotes))
+
+    @property
+    def stats(self):
+        now = time.time()
+        while self._recent and self._recent[0][0] < now - RATE_WINDOW:
+            self._recent.popleft()
+
+        return {
+            "connection": self.index,
+            "connected": self._ws is not None and not self._ws.closed,
+            "symbols": len(self.symbols),
+            "messages": self._messages,
+            "messages_per_sec": sum(n for _, n in self._recent) / RATE_WINDOW,
+            "lag": self._lag,
+            "last_message_at": self._last_message_at,
+            "reconnects": self._reconnects,
+        }
+
+
+class QuoteStream:
+    """Streams quotes for a changing set of symbols over as few sockets as possible.
+
+    Symbols are packed into connections of up to `max_symbols` each. Changing the
+    symbol set subscribes and unsubscribes on the open connections instead of
+    reconnecting.
+    """
+
+    def __init__(
+        self,
+        on_quotes,
+        max_symbols: int = MAX_SYMBOLS_PER_CONNECTION,
+        url: str = STREAM_URL,
+    ):
+        self.on_quotes = on_quotes
+        self.url = url
+        self._max_symbols = max_symbols
+        self._connections = []
+        self._connections_opened = 0
+        self._lock = asyncio.Lock()
+
+    @property
+    def symbols(self):
+        return {symbol for conn in self._connections for symbol in conn.symbols}
+
+    async def set_symbols(self, symbols):
+        async with self._lock:
+            wanted = set(symbols)
+            current = self.symbols
+
+            for conn in self._connections:
+                removed = conn.symbols - wanted
+                if removed:
+                    await conn.unsubscribe(removed)
+
+            added = sorted(wanted - current)
+            for conn in self._connections:
+                space = self._max_symbols - len(conn.symbols)
+                if added and space > 0:
+                    await conn.subscribe(added[:space])
+                    added = added[space:]
+
+            while added:
+                conn = _Connection(self, self._connections_opened)
+                self._connections_opened += 1
+                conn.symbols.update(added[: self._max_symbols])
+                added = added[self._max_symbols :]
+                self._connections.append(conn)
+                conn.start()
+
+            for conn in [conn for conn in self._connections if not conn.symbols]:
+                await conn.stop()
+                self._connections.remove(conn)
+
+    async def stop(self):
+        for conn in self._connections:
+            await conn.stop()
+        self._connections = []
+
+    @property
+    def stats(self):
+        return [conn.stats for conn in self._connections]
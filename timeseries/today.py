@@ -1,88 +1,236 @@
 import asyncio
 import datetime
+import io
+import json
+import time
 
+import aiohttp
+import numpy as np
+
+from .bars import BarBuilder, persist_bars
+from .db import DB_HOST, DB_NAME
+from .fanout import QuoteFanout
 from .PricingData_pb2 import PricingData
+from .writer import get_writer
 from .yahoo_finance import YahooFinance
 
 
+class MarketClock:
+    """Regular session bounds for the current day, as epoch seconds.
+
+    The bounds are only recomputed when the day rolls over, so checking whether
+    the market is open is a couple of float comparisons.
+    """
+
+    def __init__(
+        self,
+        open_time: datetime.time = datetime.time(9, 30),
+        close_time: datetime.time = datetime.time(16, 0),
+    ):
+        self._open_time = open_time
+        self._close_time = close_time
+        self._open = 0.0
+        self._close = 0.0
+        self._next_day = 0.0
+
+    def _refresh(self, now: float):
+        today = datetime.datetime.fromtimestamp(now).date()
+        self._open = datetime.datetime.combine(today, self._open_time).timestamp()
+        self._close = datetime.datetime.combine(today, self._close_time).timestamp()
+        self._next_day = datetime.datetime.combine(
+            today + datetime.timedelta(days=1), datetime.time()
+        ).timestamp()
+
+    def is_open(self, now: float = None) -> bool:
+        if now is None:
+            now = time.time()
+        if now >= self._next_day:
+            self._refresh(now)
+        return self._open < now < self._close
+
+
+market_clock = MarketClock()
+
+
+# symbols per multi-symbol quote request, and requests in flight, when
+# bootstrapping
+QUOTE_BATCH_SIZE = 100
+BOOTSTRAP_CONCURRENCY = 10
+# symbols streamed or refreshed this recently are skipped by incremental bootstraps
+FRESH_SECONDS = 15 * 60
+
+# how often the live state is snapshotted, to warm up restarts
+SNAPSHOT_INTERVAL = 30
+# how often the live state is shared with, and picked up by, API processes
+SHARE_INTERVAL = 0.2
+
+# columns of the ticker table, in the order they are serialized
+FIELDS = ["open", "close", "high", "low", "volume", "last_updated_at"]
+
+
+def _missing(value):
+    # unset values are NaN; zero also counts, as Yahoo reports 0 before the open
+    return not value or value != value
+
+
+class TickerTable:
+    """Day OHLCV for all symbols, stored as one numpy array per field."""
+
+    def __init__(self, symbols):
+        self._symbols = list(symbols)
+        self._slots = {symbol: slot for slot, symbol in enumerate(self._symbols)}
+        # symbols are JSON encoded once, for the bulk snapshot
+        self._symbols_json = [json.dumps(symbol) for symbol in self._symbols]
+        for field in FIELDS:
+            setattr(self, field, np.full(len(self._symbols), np.nan))
+        # when a row was last set from Yahoo's quote endpoints, not serialized
+        self.refreshed_at = np.full(len(self._symbols), np.nan)
+
+    @property
+    def symbols(self):
+        return self._symbols
+
+    def slot(self, symbol: str) -> int:
+        return self._slots[symbol]
+
+    def _column(self, field: str):
+        """Column as python values, None where unset."""
+        values = getattr(self, field)
+        unset = np.isnan(values)
+        if field == "volume":
+            values = np.nan_to_num(values).astype(np.int64)
+        values = values.astype(object)
+        values[unset] = None
+        return values
+
+    def row(self, slot: int):
+        row = {"symbol": self._symbols[slot]}
+        for field in FIELDS:
+            value = getattr(self, field)[slot].item()
+            row[field] = None if value != value else value
+        if row["volume"] is not None:
+            row["volume"] = int(row["volume"])
+        return row
+
+    def clear(self, slot=slice(None)):
+        for field in [*FIELDS, "refreshed_at"]:
+            getattr(self, field)[slot] = np.nan
+
+    def set_quotes(self, quotes: dict, refreshed_at: float):
+        """Overwrites the day OHLCV of the symbols in `quotes`."""
+        for symbol, ohlcv in quotes.items():
+            slot = self._slots.get(symbol)
+            if slot is None:
+                continue
+            self.open[slot] = ohlcv["open"]
+            self.high[slot] = ohlcv["high"]
+            self.low[slot] = ohlcv["low"]
+            self.close[slot] = ohlcv["close"]
+            self.volume[slot] = ohlcv["volume"]
+            self.refreshed_at[slot] = refreshed_at
+
+    def stale(self, since: float):
+        """Symbols without a price, or not streamed or refreshed since `since`."""
+        updated = np.fmax(self.last_updated_at, self.refreshed_at)
+        stale = np.isnan(self.close) | ~(updated >= since)
+        return [self._symbols[slot] for slot in np.flatnonzero(stale).tolist()]
+
+    def copy_from(self, other: "TickerTable"):
+        """Copies the rows of symbols present in both tables."""
+        pairs = [
+            (slot, other._slots[symbol])
+            for slot, symbol in enumerate(self._symbols)
+            if symbol in other._slots
+        ]
+        if not pairs:
+            return
+        slots, other_slots = map(list, zip(*pairs))
+        for field in [*FIELDS, "refreshed_at"]:
+            getattr(self, field)[slots] = getattr(other, field)[other_slots]
+
+    def dumps(self, session: str) -> bytes:
+        """Serializes the raw columns, tagged with the session they belong to."""
+        buf = io.BytesIO()
+        columns = {field: getattr(self, field) for field in [*FIELDS, "refreshed_at"]}
+        np.savez_compressed(
+            buf, session=np.array(session), symbols=np.array(self._symbols), **columns
+        )
+        return buf.getvalue()
+
+    @classmethod
+    def loads(cls, data: bytes):
+        """Returns the session and table of a `dumps` result."""
+        with np.load(io.BytesIO(data), allow_pickle=False) as arrays:
+            table = cls(arrays["symbols"].tolist())
+            for field in [*FIELDS, "refreshed_at"]:
+                setattr(table, field, arrays[field])
+            return arrays["session"].item(), table
+
+    def snapshot(self):
+        """Returns every row, with unset values as None."""
+        columns = [self._column(field).tolist() for field in FIELDS]
+        return [
+            dict(zip(["symbol", *FIELDS], row)) for row in zip(self._symbols, *columns)
+        ]
+
+    def snapshot_json(self) -> str:
+        """Serializes the whole table as a JSON list of rows.
+
+        Each column is converted to JSON literals in one numpy operation, rows are
+        then only string formatted.
+        """
+        columns = [self._symbols_json]
+        for field in FIELDS:
+            values = getattr(self, field)
+            if field == "volume":
+                literals = np.nan_to_num(values).astype(np.int64).astype(str)
+            else:
+                literals = values.astype(str)
+            columns.append(np.where(np.isnan(values), "null", literals).tolist())
+
+        template = ", ".join(f'"{field}": %s' for field in ["symbol", *FIELDS])
+        return (
+            "[" + ", ".join("{" + template % row + "}" for row in zip(*columns)) + "]"
+        )
+
+
 class Stock:
-    def __init__(self, symbol):
+    """View onto one symbol's row in a TickerTable."""
+
+    __slots__ = ("_table", "_slot", "_symbol")
+
+    def __init__(self, table: TickerTable, symbol: str):
+        self._table = table
+        self._slot = table.slot(symbol)
         self._symbol = symbol
-        self._open = None
-        self._close = None
-        self._high = None
-        self._low = None
-        self._volume = None
-        self._last_updated_at = None
-
-    async def bootstrap(self):
-
-        # print("bootstrapping for", self._symbol)
-
-        try:
-            # use v10 because it only shows regular market OHLCV, need to be able
-            # to bootstrap after hours and get regular market OHLCV
-
-            ohlc = await YahooFinance().get_today_quote_v10(self._symbol)
-            self._open = ohlc["open"]
-            self._high = ohlc["high"]
-            self._low = ohlc["low"]
-            self._close = ohlc["close"]
-            self._volume = ohlc["volume"]
-
-        # Black formatter complains that ex is "assigned but never used" here
-        # except Exception as ex:
-        except Exception:
-            # print("exception in bootstrap for symbol", self._symbol, ex)
-            pass
 
     def on_transction(self, price, volume, timestamp):
 
-        now = datetime.datetime.now()
-        today4pm = now.replace(hour=16, minute=0, second=0, microsecond=0)
-        today930am = now.replace(hour=9, minute=30, second=0, microsecond=0)
-
         # Don't update price after hours
-        if today930am < now < today4pm:
-
-            if not self._high:
-                self._high = price
-            if not self._low:
-                self._low = price
-            if not self._open:
-                self._open = price
-            if not self._close:
-                self._close = price
-            if not self._volume:
-                self._volume = volume
-
-            self._last_updated_at = timestamp
-            self._close = price
-            if price < self._low:
-                self._low = price
-            if price > self._high:
-                self._high = price
-            self._volume = volume
+        if market_clock.is_open():
+            table, slot = self._table, self._slot
+
+            high = table.high[slot]
+            low = table.low[slot]
+            if _missing(high):
+                high = price
+            if _missing(low):
+                low = price
+            if _missing(table.open[slot]):
+                table.open[slot] = price
+
+            table.last_updated_at[slot] = timestamp
+            table.close[slot] = price
+            table.low[slot] = price if price < low else low
+            table.high[slot] = price if price > high else high
+            table.volume[slot] = volume
 
     @property
     def json(self):
-        return {
-            "symbol": self._symbol,
-            "open": self._open,
-            "close": self._close,
-            "high": self._high,
-            "low": self._low,
-            "volume": self._volume,
-            "last_updated_at": self._last_updated_at,
-        }
+        return self._table.row(self._slot)
 
     def clear(self):
-        self._open = None
-        self._close = None
-        self._high = None
-        self._low = None
-        self._volume = None
-        self._last_updated_at = None
+        self._table.clear(self._slot)
 
 
 class TickerManager:
@@ -91,42 +239,172 @@ class TickerManager:
 
         self._queue = asyncio.Queue()
         self._yf = YahooFinance()
+        self._bars = BarBuilder()
+        self._table = None
+        self._tickers = {}
+        self._stream = None
+        self.fanout = QuoteFanout(self.get_ohlcv)
+        self.bootstrap_stats = {}
 
     def set_symbols(self, symbols):
         # print(symbols)
+        previous = self._table
         self._symbols = symbols
-        self._tickers = {symbol: Stock(symbol) for symbol in self._symbols}
-
-    async def bootstrap(self):
-        tasks = []
-        # 200 appears to be stable but didn't test upper limit. Took 25 seconds on local computer,
-        # so presumably faster in the cloud. Can adjust later if needed.
-
-        chunk = 200
-        for i in range(0, len(self._symbols), chunk):
-            chunked = self._symbols[i : i + chunk]
-            for symbol in chunked:
-                tasks.append(
-                    asyncio.wait_for(self._tickers[symbol].bootstrap(), timeout=10.0)
-                )
-
-            await asyncio.gather(*tasks, return_exceptions=True)
-
-            # After chunk completes, begin next chunk
-            tasks = []
+        self._table = TickerTable(self._symbols)
+        if previous is not None:
+            self._table.copy_from(previous)
+        self._tickers = {symbol: Stock(self._table, symbol) for symbol in self._symbols}
+
+        # already streaming, move the subscriptions over to the new symbols
+        if self._stream is not None:
+            asyncio.create_task(self._stream.set_symbols(self._symbols))
+
+    async def bootstrap(self, skip_fresh: bool = True):
+        """Sets day OHLCV for all symbols from Yahoo's multi-symbol quote endpoint.
+
+        Requests go out in a sliding window of BOOTSTRAP_CONCURRENCY, results are
+        applied as they arrive. With `skip_fresh`, symbols that were streamed or
+        refreshed in the last FRESH_SECONDS are left alone.
+        """
+        start_time = time.time()
+        if skip_fresh:
+            symbols = self._table.stale(start_time - FRESH_SECONDS)
+        else:
+            symbols = list(self._symbols)
+
+        batches = [
+            symbols[i : i + QUOTE_BATCH_SIZE]
+            for i in range(0, len(symbols), QUOTE_BATCH_SIZE)
+        ]
+        semaphore = asyncio.Semaphore(BOOTSTRAP_CONCURRENCY)
+        received = 0
+        failed_requests = 0
+
+        async with aiohttp.ClientSession() as session:
+
+            async def fetch(batch):
+                async with semaphore:
+                    return await asyncio.wait_for(
+                        self._yf.get_today_quotes(batch, session), timeout=10.0
+                    )
+
+            for result in asyncio.as_completed([fetch(batch) for batch in batches]):
+                try:
+                    quotes = await result
+                except Exception as ex:
+                    failed_requests += 1
+                    print("bootstrap request failed", ex)
+                    continue
+                self._table.set_quotes(quotes, time.time())
+                received += len(quotes)
+
+        self.bootstrap_stats = {
+            "started_at": start_time,
+            "duration": time.time() - start_time,
+            "symbols": len(self._symbols),
+            "requested": len(symbols),
+            "skipped_fresh": len(self._symbols) - len(symbols),
+            "received": received,
+            "failed_symbols": len(symbols) - received,
+            "requests": len(batches),
+            "failed_requests": failed_requests,
+        }
+        return self.bootstrap_stats
+
+    def dump_state(self) -> bytes:
+        return self._table.dumps(datetime.date.today().isoformat())
+
+    def restore_state(self, data: bytes) -> bool:
+        """Restores the rows of a `dump_state` result taken earlier today.
+
+        Returns whether anything was restored; state from a previous session is
+        ignored, as it's cleared at midnight anyway.
+        """
+        session, table = TickerTable.loads(data)
+        if session != datetime.date.today().isoformat():
+            return False
+        self._table.copy_from(table)
+        return True
+
+    async def persist_state(self, save, interval: float = SNAPSHOT_INTERVAL):
+        """Periodically passes `dump_state` to the `save` coroutine function."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await save(self.dump_state())
+            except Exception as ex:
+                print("saving ticker state failed", ex)
+
+    async def share(self, writer, interval: float = SHARE_INTERVAL):
+        """Periodically publishes the table to a SharedTickerWriter."""
+        while True:
+            try:
+                writer.publish(self._table)
+            except Exception as ex:
+                print("sharing ticker state failed", ex)
+            await asyncio.sleep(interval)
+
+    async def follow(self, reader, interval: float = SHARE_INTERVAL):
+        """Mirrors the table another process shares, instead of streaming.
+
+        Live quote subscribers are fed the rows that changed since the last read.
+        """
+        asyncio.create_task(self.fanout.run())
+        while True:
+            try:
+                changed = reader.read()
+            except Exception as ex:
+                print("reading shared ticker state failed", ex)
+                changed = None
+            if changed is not None:
+                if reader.table is not self._table:
+                    self._table = reader.table
+                    self._symbols = reader.table.symbols
+                    self._tickers = {
+                        symbol: Stock(self._table, symbol) for symbol in self._symbols
+                    }
+                for symbol in changed:
+                    self.fanout.mark(symbol)
+            await asyncio.sleep(interval)
 
     async def on_quote(self, pd: PricingData):
-        symbol = pd.id
-        price = pd.price
-        timestamp = pd.time / 1000
-        volume = pd.dayVolume
-        self._tickers[symbol].on_transction(price, volume, timestamp)
+        self.on_quotes([(pd.id, pd.price, pd.time, pd.marketHours, pd.dayVolume)])
+
+    def on_quotes(self, quotes):
+        """Applies a batch of decoded (id, price, time, marketHours, dayVolume)."""
+        tickers = self._tickers
+        bars = self._bars
+        fanout = self.fanout
+        regular_market = PricingData.REGULAR_MARKET
+        for symbol, price, time_ms, market_hours, volume in quotes:
+            stock = tickers.get(symbol)
+            if stock is None:
+                # unsubscribed while the message was in flight
+                continue
+            timestamp = time_ms / 1000
+            stock.on_transction(price, volume, timestamp)
+            fanout.mark(symbol)
+
+            # intraday bars are built from the stream instead of polling Yahoo
+            if market_hours == regular_market:
+                bars.on_tick(symbol, price, volume, timestamp)
 
     async def start(self):
-        await self._yf.quotes_for(self._symbols, self.on_quote)
+        asyncio.create_task(
+            persist_bars(self._bars, lambda: get_writer(DB_NAME, DB_HOST))
+        )
+        asyncio.create_task(self.fanout.run())
+        self._stream = await self._yf.quotes_for(self._symbols, self.on_quotes)
+
+    @property
+    def stream_stats(self):
+        return self._stream.stats if self._stream is not None else []
 
     def get_all_ohlcv(self):
-        return [stock.json for symbol, stock in self._tickers.items()]
+        return self._table.snapshot()
+
+    def get_all_ohlcv_json(self):
+        return self._table.snapshot_json()
 
     def get_ohlcv(self, symbol):
 
@@ -150,5 +428,5 @@ class TickerManager:
         return ohlcv
 
     def clear_all(self):
-        for symbol in self._symbols:
-            self._tickers[symbol].clear()
+        self._table.clear()
+        self._bars.clear()
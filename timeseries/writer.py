@@ -0,0 +1,321 @@
+import asyncio
+import collections
+import datetime
+import logging
+import math
+import numbers
+import time
+
+import numpy as np
+
+from aioinflux import InfluxDBClient
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 5000
+FLUSH_INTERVAL = 1.0
+MAX_BUFFERED_POINTS = 50000
+WRITE_RETRIES = 3
+RETRY_BACKOFF = 0.5
+# window over which points/sec is reported
+RATE_WINDOW = 60.0
+
+_key_escape = str.maketrans(
+    {"\\": "\\\\", ",": r"\,", " ": r"\ ", "=": r"\=", "\n": ""}
+)
+_str_escape = str.maketrans({"\\": "\\\\", '"': r"\"", "\n": ""})
+
+
+def _escape_key(value) -> str:
+    return str(value).translate(_key_escape)
+
+
+def _encode_field(value):
+    # same typing rules as aioinflux, so fields keep the types they were created
+    # with: python ints are integers, strings are quoted, everything else is a float
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return str(value)
+    if isinstance(value, int):
+        return f"{value}i"
+    if isinstance(value, str):
+        return '"' + value.translate(_str_escape) + '"'
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return str(value)
+
+
+def encode_timestamp(ts) -> int:
+    if isinstance(ts, numbers.Integral):
+        return int(ts)
+    if isinstance(ts, str):
+        ts = datetime.datetime.fromisoformat(ts)
+    if not ts.tzinfo:
+        # aioinflux treats naive datetimes as UTC this way, keep it identical so
+        # rewrites land on the existing points
+        return int(ts.timestamp() - time.timezone) * 10 ** 9 + ts.microsecond * 1000
+    return int(ts.timestamp()) * 10 ** 9 + ts.microsecond * 1000
+
+
+def encode_point(measurement: str, tags: dict, fields: dict, timestamp) -> str:
+    """Encodes a single point as a line of Influx line protocol.
+
+    Returns None when the point has no non-null fields.
+    """
+    encoded_fields = []
+    for key, value in fields.items():
+        value = _encode_field(value)
+        if value is not None:
+            encoded_fields.append(f"{_escape_key(key)}={value}")
+    if not encoded_fields:
+        return None
+
+    encoded_tags = "".join(
+        f",{_escape_key(key)}={_escape_key(value)}"
+        for key, value in tags.items()
+        if value
+    )
+    return (
+        f"{_escape_key(measurement)}{encoded_tags} {','.join(encoded_fields)}"
+        f" {encode_timestamp(timestamp)}"
+    )
+
+
+def encode_dataframe(dataframe, measurement: str, tag_columns=()) -> list:
+    """Encodes a DataFrame with a DatetimeIndex, one line per row."""
+    timestamps = dataframe.index.values.astype("datetime64[ns]").astype(np.int64)
+    tag_columns = [column for column in dataframe.columns if column in tag_columns]
+    field_columns = [
+        column for column in dataframe.columns if column not in tag_columns
+    ]
+    tags = [dataframe[column].tolist() for column in tag_columns]
+    fields = [dataframe[column].tolist() for column in field_columns]
+
+    lines = []
+    for row, timestamp in enumerate(timestamps.tolist()):
+        line = encode_point(
+            measurement,
+            {column: values[row] for column, values in zip(tag_columns, tags)},
+            {column: values[row] for column, values in zip(field_columns, fields)},
+            timestamp,
+        )
+        if line is not None:
+            lines.append(line)
+    return lines
+
+
+class InfluxWriter:
+    """Write-behind buffer for one Influx database.
+
+    Lines are buffered in memory and written in batches of `batch_size`, or every
+    `flush_interval` seconds, whichever comes first. Writers block once
+    `max_buffered` lines are waiting. `written` tells when queued lines are out,
+    without forcing a flush.
+    """
+
+    def __init__(
+        self,
+        db: str,
+        host: str,
+        batch_size: int = BATCH_SIZE,
+        flush_interval: float = FLUSH_INTERVAL,
+        max_buffered: int = MAX_BUFFERED_POINTS,
+        retries: int = WRITE_RETRIES,
+    ):
+        self._db = db
+        self._host = host
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._max_buffered = max_buffered
+        self._retries = retries
+
+        self._loop = asyncio.get_event_loop()
+        self._buffer = collections.deque()
+        self._not_full = asyncio.Condition()
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._client = None
+        self._flush_task = None
+        self._closed = False
+        # lines ever queued and ever written or dropped, and the futures of
+        # `written` waiting for a count of lines to be done, in order
+        self._queued = 0
+        self._done = 0
+        self._waiters = collections.deque()
+
+        self._points_written = 0
+        self._points_dropped = 0
+        self._batches_written = 0
+        self._batches_failed = 0
+        self._last_flush_latency = None
+        self._total_flush_latency = 0.0
+        self._recent_writes = collections.deque()
+
+    @property
+    def loop(self):
+        return self._loop
+
+    async def write(self, lines):
+        """Queues lines for writing, waiting while the buffer is full."""
+        if self._closed:
+            raise RuntimeError(f"writer for {self._db} is closed")
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+        async with self._not_full:
+            await self._not_full.wait_for(
+                lambda: len(self._buffer) < self._max_buffered
+            )
+            self._buffer.extend(lines)
+            self._queued += len(lines)
+
+        if len(self._buffer) >= self._batch_size:
+            self._wakeup.set()
+
+    def written(self) -> asyncio.Future:
+        """A future done once the lines queued so far are written, or dropped.
+
+        Lines go out with the regular batches, nothing is flushed early.
+        """
+        future = self._loop.create_future()
+        if self._done >= self._queued:
+            future.set_result(None)
+        else:
+            self._waiters.append((self._queued, future))
+        return future
+
+    def _batch_done(self, size: int):
+        self._done += size
+        while self._waiters and self._waiters[0][0] <= self._done:
+            _, future = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+
+    async def flush(self):
+        """Writes out everything buffered so far."""
+        async with self._flush_lock:
+            while self._buffer:
+                await self._write_batch()
+
+    async def close(self):
+        self._closed = True
+        # take the lock so a batch that is already being written isn't cancelled
+        async with self._flush_lock:
+            if self._flush_task is not None:
+                self._flush_task.cancel()
+                await asyncio.gather(self._flush_task, return_exceptions=True)
+        await self.flush()
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self._flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            async with self._flush_lock:
+                # write at least one batch, then carry on only while full batches
+                # are waiting; a partial remainder goes out on the next interval
+                while self._buffer:
+                    await self._write_batch()
+                    if len(self._buffer) < self._batch_size:
+                        break
+
+    async def _get_client(self):
+        if self._client is None:
+            client = InfluxDBClient(db=self._db, host=self._host)
+            await client.create_database(db=self._db)
+            self._client = client
+        return self._client
+
+    async def _write_batch(self):
+        size = min(len(self._buffer), self._batch_size)
+        batch = [self._buffer.popleft() for _ in range(size)]
+        async with self._not_full:
+            self._not_full.notify_all()
+
+        payload = "\n".join(batch)
+        for attempt in range(self._retries + 1):
+            start = time.perf_counter()
+            try:
+                client = await self._get_client()
+                await client.write(payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                if attempt == self._retries:
+                    self._batches_failed += 1
+                    self._points_dropped += size
+                    logger.exception(
+                        "dropping batch of %s points for %s after %s attempts",
+                        size,
+                        self._db,
+                        attempt + 1,
+                    )
+                    self._batch_done(size)
+                    return
+                await asyncio.sleep(RETRY_BACKOFF * 2 ** attempt)
+            else:
+                latency = time.perf_counter() - start
+                self._last_flush_latency = latency
+                self._total_flush_latency += latency
+                self._batches_written += 1
+                self._points_written += size
+                self._recent_writes.append((time.monotonic(), size))
+                self._batch_done(size)
+                return
+
+    @property
+    def stats(self):
+        now = time.monotonic()
+        while self._recent_writes and self._recent_writes[0][0] < now - RATE_WINDOW:
+            self._recent_writes.popleft()
+
+        return {
+            "db": self._db,
+            "buffered": len(self._buffer),
+            "points_written": self._points_written,
+            "points_dropped": self._points_dropped,
+            "batches_written": self._batches_written,
+            "batches_failed": self._batches_failed,
+            "points_per_sec": sum(n for _, n in self._recent_writes) / RATE_WINDOW,
+            "last_flush_latency": self._last_flush_latency,
+            "avg_flush_latency": self._total_flush_latency / self._batches_written
+            if self._batches_written
+            else None,
+        }
+
+
+_writers = {}
+
+
+def get_writer(db: str, host: str) -> InfluxWriter:
+    """Returns the shared writer for `db`, creating it for the running loop."""
+    writer = _writers.get((db, host))
+    if writer is None or writer.loop is not asyncio.get_event_loop():
+        writer = _writers[(db, host)] = InfluxWriter(db, host)
+    return writer
+
+
+async def flush_writers():
+    loop = asyncio.get_event_loop()
+    for writer in list(_writers.values()):
+        if writer.loop is loop:
+            await writer.flush()
+
+
+async def close_writers():
+    loop = asyncio.get_event_loop()
+    for key, writer in list(_writers.items()):
+        if writer.loop is loop:
+            await writer.close()
+            del _writers[key]
+
+
+def writer_stats():
+    return [writer.stats for writer in _writers.values()]
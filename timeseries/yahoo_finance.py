@@ -1,5 +1,4 @@
 import asyncio
-import base64
 import datetime
 import enum
 import json
@@ -8,7 +7,20 @@ import aiohttp
 
 from debug.printException import PrintExceptionInfo
 
-from .PricingData_pb2 import PricingData
+from .stream import QuoteStream
+
+# max chunk requests in flight per symbol in get_historical_data_chunked
+CHUNK_CONCURRENCY = 4
+CHUNK_RETRIES = 3
+CHUNK_RETRY_BACKOFF = 0.5
+
+# key statistics pages are read in chunks of this size, until floatShares is found
+PAGE_CHUNK_SIZE = 64 * 1024
+# the floatShares value is a small object, give up if it isn't parsed within this
+FLOAT_SHARES_WINDOW = 1024
+
+_QUOTE_SUMMARY_STORE = b'"QuoteSummaryStore"'
+_FLOAT_SHARES = b'"floatShares":'
 
 
 class Interval(enum.Enum):
@@ -27,12 +39,64 @@ class Interval(enum.Enum):
     THREE_MONTH = "3mo"
 
 
+class FloatSharesScanner:
+    """Finds floatShares in a key statistics page, as the page is downloaded.
+
+    Rather than parsing the whole root.App.main blob, the scan looks for the
+    QuoteSummaryStore and its floatShares key, and only decodes the JSON value
+    that follows. `done` is set once the value is parsed, or can't be.
+    """
+
+    def __init__(self):
+        self._buf = b""
+        self._in_store = False
+        self._in_value = False
+        self.done = False
+        self.value = None
+
+    def feed(self, chunk: bytes):
+        buf = self._buf + chunk
+        while not self._in_value:
+            pattern = _FLOAT_SHARES if self._in_store else _QUOTE_SUMMARY_STORE
+            found = buf.find(pattern)
+            if found < 0:
+                # the pattern may continue in the next chunk
+                self._buf = buf[-(len(pattern) - 1) :]
+                return
+            buf = buf[found + len(pattern) :]
+            if self._in_store:
+                self._in_value = True
+            else:
+                self._in_store = True
+        self._buf = buf[:FLOAT_SHARES_WINDOW]
+        self._decode(final=len(buf) >= FLOAT_SHARES_WINDOW)
+
+    def finish(self):
+        """Called at the end of the page."""
+        if self._in_value and not self.done:
+            self._decode(final=True)
+        self.done = True
+
+    def _decode(self, final: bool):
+        text = self._buf.decode("utf-8", "ignore").lstrip()
+        try:
+            value, end = json.JSONDecoder().raw_decode(text)
+        except ValueError:
+            self.done = final
+            return
+        # a number cut off at the end of the chunk would decode too
+        if end < len(text) or final:
+            self.value = value
+            self.done = True
+
+
 class YahooFinance:
     def __init__(self):
         self._base_uri = "https://query1.finance.yahoo.com/v8/finance/chart"
         self._base_uri_v10 = (
             "https://query1.finance.yahoo.com/v10/finance/quoteSummary/"
         )
+        self._base_uri_v7_quote = "https://query1.finance.yahoo.com/v7/finance/quote"
         MAX = 36500
 
         self._intervals = {
@@ -80,6 +144,7 @@ class YahooFinance:
         start: datetime.datetime,
         end: datetime.datetime,
         interval: Interval,
+        session: aiohttp.ClientSession = None,
     ):
         params = {
             "symbol": symbol,
@@ -88,11 +153,34 @@ class YahooFinance:
             "interval": interval.value,
         }
 
-        async with aiohttp.ClientSession() as session:
-            # print(f"{self._base_uri}/{symbol} params={params}")
-            async with session.get(f"{self._base_uri}/{symbol}", params=params) as resp:
-                # print(resp.url)
-                return await resp.json()
+        if session is None:
+            async with aiohttp.ClientSession() as session:
+                return await self._data_request(symbol, start, end, interval, session)
+
+        # print(f"{self._base_uri}/{symbol} params={params}")
+        async with session.get(f"{self._base_uri}/{symbol}", params=params) as resp:
+            # print(resp.url)
+            return await resp.json()
+
+    async def _data_request_with_retry(
+        self,
+        symbol: str,
+        start: datetime.datetime,
+        end: datetime.datetime,
+        interval: Interval,
+        session: aiohttp.ClientSession = None,
+        retries: int = CHUNK_RETRIES,
+    ):
+        for attempt in range(retries + 1):
+            try:
+                return await self._data_request(symbol, start, end, interval, session)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == retries:
+                    raise
+                print(
+                    f"chunk request failed for {symbol} [{start}, {end}], retrying: {e}"
+                )
+                await asyncio.sleep(CHUNK_RETRY_BACKOFF * 2 ** attempt)
 
     async def get_all_data(self, symbol: str, interval: Interval):
         to = datetime.datetime.utcnow()
@@ -165,7 +253,17 @@ class YahooFinance:
                     continue
 
                 quote = result["indicators"]["quote"][0]
-                res["timestamps"] += result["timestamp"]
+                timestamps = result["timestamp"]
+
+                # adjacent chunks share their boundary, so the bar at the boundary
+                # can come back twice; drop anything we already have
+                skip = 0
+                if res["timestamps"]:
+                    last_timestamp = res["timestamps"][-1]
+                    while skip < len(timestamps) and timestamps[skip] <= last_timestamp:
+                        skip += 1
+
+                res["timestamps"] += timestamps[skip:]
 
             except TypeError as e:
                 import pprint
@@ -184,17 +282,16 @@ class YahooFinance:
                 pprint.pprint(data)
                 raise e
 
-            res["open"] += quote["open"]
-            res["close"] += quote["close"]
-            res["high"] += quote["high"]
-            res["low"] += quote["low"]
-            res["volume"] += quote["volume"]
+            res["open"] += quote["open"][skip:]
+            res["close"] += quote["close"][skip:]
+            res["high"] += quote["high"][skip:]
+            res["low"] += quote["low"][skip:]
+            res["volume"] += quote["volume"][skip:]
 
         return res
 
-    async def get_historical_data_chunked(
+    def _chunk_ranges(
         self,
-        symbol: str,
         frm: datetime.datetime,
         to: datetime.datetime,
         interval: Interval,
@@ -209,17 +306,44 @@ class YahooFinance:
             if curr_start == to:
                 break
 
-            yield await self._data_request(
-                symbol,
-                curr_start,
-                curr_end,
-                interval,
-            )
+            yield curr_start, curr_end
             curr_start = curr_end
             curr_end = curr_start + chunk_size
             if curr_end > to:
                 curr_end = to
 
+    async def get_historical_data_chunked(
+        self,
+        symbol: str,
+        frm: datetime.datetime,
+        to: datetime.datetime,
+        interval: Interval,
+        concurrency: int = CHUNK_CONCURRENCY,
+    ):
+        # all chunk requests are issued up front (at most `concurrency` in flight),
+        # but responses are still yielded in chronological order
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async with aiohttp.ClientSession() as session:
+
+            async def fetch(start, end):
+                async with semaphore:
+                    return await self._data_request_with_retry(
+                        symbol, start, end, interval, session
+                    )
+
+            tasks = [
+                asyncio.ensure_future(fetch(start, end))
+                for start, end in self._chunk_ranges(frm, to, interval)
+            ]
+            try:
+                for task in tasks:
+                    yield await task
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+
     async def get_last_price(self, symbol: str):
         async with aiohttp.ClientSession() as session:
             async with session.get(f"{self._base_uri}/{symbol}") as resp:
@@ -277,41 +401,64 @@ class YahooFinance:
                         e,
                     )
 
+    async def get_today_quotes(self, symbols, session: aiohttp.ClientSession = None):
+        """Regular market OHLCV for many symbols with a single request.
+
+        Symbols Yahoo returns nothing usable for are left out of the result.
+        """
+        if session is None:
+            async with aiohttp.ClientSession() as session:
+                return await self.get_today_quotes(symbols, session)
+
+        async with session.get(
+            self._base_uri_v7_quote, params={"symbols": ",".join(symbols)}
+        ) as resp:
+            results = (await resp.json())["quoteResponse"]["result"] or []
+
+        quotes = {}
+        for quote in results:
+            try:
+                quotes[quote["symbol"]] = {
+                    "open": quote["regularMarketOpen"],
+                    "high": quote["regularMarketDayHigh"],
+                    "low": quote["regularMarketDayLow"],
+                    "close": quote["regularMarketPrice"],
+                    "volume": quote["regularMarketVolume"],
+                }
+            except KeyError:
+                # presumably delisted, no regular market data
+                continue
+        return quotes
+
     async def get_live_quote(self, symbol):
         pass
 
-    async def quotes_for_tickers(self, tickers, on_quote):
-        while True:
-            try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.ws_connect(
-                        "wss://streamer.finance.yahoo.com/", heartbeat=300
-                    ) as ws:
-                        await ws.send_json({"subscribe": tickers})
-                        async for msg in ws:
-                            pd = PricingData()
-                            pd.ParseFromString(base64.b64decode(msg.data))
-                            await on_quote(pd)
-            except Exception as ex:
-                print("an exception occured", ex)
-
-    async def quotes_for(self, tickers, on_quote):
-        chunk_size = 60
-        for i in range(0, len(tickers), chunk_size):
-            chunked = tickers[i : i + chunk_size]
-            asyncio.create_task(self.quotes_for_tickers(chunked, on_quote))
-
-    async def get_key_statistic_float_shares(self, symbol):
-        async with aiohttp.ClientSession(skip_auto_headers=["user-agent"]) as session:
-            async with session.get(
-                f"https://finance.yahoo.com/quote/{symbol}/key-statistics?p={symbol}",
-            ) as resp:
-                html = await resp.text()
-                for line in html.splitlines():
-                    if "root.App.main = " in line:
-                        data = line.replace("root.App.main = ", "")[:-1]
-                        data = json.loads(data)
-                        float_shares = data["context"]["dispatcher"]["stores"][
-                            "QuoteSummaryStore"
-                        ]["defaultKeyStatistics"]["floatShares"]
-                        return float_shares
+    async def quotes_for(self, tickers, on_quotes):
+        stream = QuoteStream(on_quotes)
+        await stream.set_symbols(tickers)
+        return stream
+
+    async def get_key_statistic_float_shares(
+        self, symbol, session: aiohttp.ClientSession = None
+    ):
+        """The floatShares key statistic, e.g. {"raw": ..., "fmt": ...}.
+
+        Returns None when the page doesn't have it.
+        """
+        if session is None:
+            async with aiohttp.ClientSession(
+                skip_auto_headers=["user-agent"]
+            ) as session:
+                return await self.get_key_statistic_float_shares(symbol, session)
+
+        async with session.get(
+            f"https://finance.yahoo.com/quote/{symbol}/key-statistics?p={symbol}",
+        ) as resp:
+            scanner = FloatSharesScanner()
+            async for chunk in resp.content.iter_chunked(PAGE_CHUNK_SIZE):
+                scanner.feed(chunk)
+                if scanner.done:
+                    # the rest of the page isn't needed
+                    break
+            scanner.finish()
+            return scanner.value
@@ -0,0 +1,158 @@
+import hashlib
+import logging
+import os
+import time
+
+import aioredis
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = "redis://localhost"
+# name -> bump count, and name -> time of the last bump
+COUNTERS_KEY = "fpc:versions"
+MODIFIED_KEY = "fpc:versions:modified"
+# "<id>:<time>" of the first process that connected, changes only if Redis lost
+# the versions and counters start over
+EPOCH_KEY = "fpc:versions:epoch"
+# the same, set by serve.py for the processes it starts, so a deploy changes it
+EPOCH_ENV = "VERSIONS_EPOCH"
+# "<name>:<digest>" -> time the digest was first seen
+DIGESTS_KEY = "fpc:versions:digests"
+
+
+class Versions:
+    """Version stamps of the data the read endpoints are built from.
+
+    Whoever changes some data bumps the stamp of what it changed, e.g.
+    "fundamentals" or "candles:AAPL", and the handlers of its event apply the
+    stamps once their in-memory caches are rebuilt. A response depending on some
+    stamps can then be validated without building it. Data every process loads
+    for itself, like the strategies, is stamped by a digest of its content.
+
+    Once connected the stamps live in Redis, so every process derives the same
+    ETag and Last-Modified from them and a shared epoch. A process on its own
+    keeps them in memory and, as they start over with it, its own random epoch
+    is part of every ETag.
+    """
+
+    def __init__(self):
+        epoch = os.environ.get(EPOCH_ENV) or f"{os.urandom(8).hex()}:{time.time()}"
+        self._set_epoch(epoch)
+        # name -> (counter, time of the last bump), as bumped and as applied
+        self._shared = {}
+        self._versions = {}
+        # name -> (digest, time it was first seen)
+        self._digests = {}
+        self._redis = None
+
+    async def connect(self, url: str = REDIS_URL):
+        self._redis = await aioredis.create_redis_pool(url)
+        if EPOCH_ENV not in os.environ:
+            await self._redis.set(
+                EPOCH_KEY,
+                f"{os.urandom(8).hex()}:{time.time()}",
+                exist=self._redis.SET_IF_NOT_EXIST,
+            )
+            self._set_epoch(await self._redis.get(EPOCH_KEY, encoding="utf-8"))
+
+        tr = self._redis.multi_exec()
+        counters = tr.hgetall(COUNTERS_KEY, encoding="utf-8")
+        modified = tr.hgetall(MODIFIED_KEY, encoding="utf-8")
+        await tr.execute()
+        counters, modified = await counters, await modified
+        self.apply(
+            {
+                name: (int(counter), float(modified[name]))
+                for name, counter in counters.items()
+                if name in modified
+            }
+        )
+
+    def _set_epoch(self, epoch: str):
+        boot, started = epoch.split(":")
+        self._boot, self._started = boot, float(started)
+
+    async def close(self):
+        if self._redis is not None:
+            self._redis.close()
+            await self._redis.wait_closed()
+            self._redis = None
+
+    async def bump(self, *names):
+        """Bumps the stamps of `names`, shown once an event handler applies them."""
+        now = time.time()
+        if not names:
+            return
+        if self._redis is not None:
+            try:
+                tr = self._redis.multi_exec()
+                for name in names:
+                    tr.hincrby(COUNTERS_KEY, name)
+                tr.hmset(
+                    MODIFIED_KEY, *(value for name in names for value in (name, now))
+                )
+                await tr.execute()
+                return
+            except Exception:
+                logger.exception("bumping versions in Redis failed")
+        for name in names:
+            counter, _ = self._shared.get(name, (0, None))
+            self._shared[name] = (counter + 1, now)
+
+    async def fetch(self, *names) -> dict:
+        """The current stamps of `names`, to `apply` once the data is rebuilt."""
+        if not names:
+            return {}
+        if self._redis is not None:
+            try:
+                tr = self._redis.multi_exec()
+                counters = tr.hmget(COUNTERS_KEY, *names, encoding="utf-8")
+                modified = tr.hmget(MODIFIED_KEY, *names, encoding="utf-8")
+                await tr.execute()
+                return {
+                    name: (int(counter), float(at))
+                    for name, counter, at in zip(names, await counters, await modified)
+                    if counter is not None and at is not None
+                }
+            except Exception:
+                logger.exception("fetching versions from Redis failed")
+        return {name: self._shared[name] for name in names if name in self._shared}
+
+    async def set_digest(self, name: str, digest: str):
+        """Stamps `name` by a digest of its content, instead of by bumps."""
+        if self._digests.get(name, (None, None))[0] == digest:
+            return
+        modified = time.time()
+        if self._redis is not None:
+            field = f"{name}:{digest}"
+            try:
+                await self._redis.hsetnx(DIGESTS_KEY, field, modified)
+                modified = float(
+                    await self._redis.hget(DIGESTS_KEY, field, encoding="utf-8")
+                )
+            except Exception:
+                logger.exception("sharing the %s digest in Redis failed", name)
+        self._digests[name] = (digest, modified)
+
+    def apply(self, stamps: dict):
+        for name, (counter, modified) in stamps.items():
+            if counter > self._versions.get(name, (0, None))[0]:
+                self._versions[name] = (counter, modified)
+
+    def stamp(self, names):
+        """Returns the ETag and last modified time for data depending on `names`."""
+        parts = [self._boot]
+        last_modified = self._started
+        for name in names:
+            if name in self._digests:
+                version, modified = self._digests[name]
+            else:
+                version, modified = self._versions.get(name, (0, None))
+            parts.append(f"{name}={version}")
+            if modified is not None:
+                last_modified = max(last_modified, modified)
+        etag = hashlib.sha1(";".join(parts).encode()).hexdigest()[:20]
+        return f'"{etag}"', last_modified
+
+
+versions = Versions()
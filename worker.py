@@ -0,0 +1,45 @@
+"""Runs the ingestion and aggregation crons without serving HTTP.
+
+Start it next to API processes started with ROLE=api, which then only serve
+requests and the live tickers. Data changes reach them over Redis, see events.py,
+and the uploads they take are queued there for this process to run, see jobs.py.
+"""
+import asyncio
+import os
+import signal
+
+os.environ.setdefault("ROLE", "worker")
+
+from aiohttp import web  # noqa: E402
+
+import server  # noqa: E402
+
+
+async def run_worker():
+    # the app's startup and cleanup hooks, without a site listening for requests
+    runner = web.AppRunner(server.app)
+    await runner.setup()
+    print(f"worker started, role {server.ROLE}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+def main():
+    loop = asyncio.get_event_loop()
+    main = loop.create_task(run_worker())
+    loop.add_signal_handler(signal.SIGTERM, main.cancel)
+    try:
+        loop.run_until_complete(main)
+    except KeyboardInterrupt:
+        main.cancel()
+        loop.run_until_complete(asyncio.gather(main, return_exceptions=True))
+    except asyncio.CancelledError:
+        pass
+    finally:
+        loop.close()
+
+
+if __name__ == "__main__":
+    main()